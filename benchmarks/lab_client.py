@@ -0,0 +1,291 @@
+"""Latency and throughput benchmarks of the lab client.
+
+Everything runs against a local :class:`~nyquist.lab.emulator.Emulator`, so
+no device is needed. The results are printed (or written to a file) as
+JSON, to compare releases::
+
+    python benchmarks/lab_client.py --output results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from nyquist.control import Experiment, HybridClock, MonotonicClock
+from nyquist.lab.emulator import Emulator
+from nyquist._private.network.http import (
+    _HTTPResourcer,
+    _compile_urls,
+    _value_url,
+    _verb_url,
+)
+from nyquist._private.network.ws import _WSResourcer
+
+
+ANGLE_URI = "/sensors/encoder/angle"
+DUTY_URI = "/propeller/pwm/duty"
+TIMEOUT_S = 2
+"""The maximum time [s] to wait for a telemetry message or a command, so a
+lost one fails the benchmark instead of hanging it."""
+
+
+def summarize(samples_s):
+    """Summarize a list of durations, in microseconds."""
+    samples_us = np.asarray(samples_s) * 1e6
+    return {
+        "count": len(samples_us),
+        "mean_us": float(np.mean(samples_us)),
+        "p50_us": float(np.percentile(samples_us, 50)),
+        "p90_us": float(np.percentile(samples_us, 90)),
+        "p99_us": float(np.percentile(samples_us, 99)),
+        "max_us": float(np.max(samples_us)),
+    }
+
+
+async def wait_telemetry(resourcer):
+    """Wait for the next telemetry message, within the timeout."""
+    try:
+        return await resourcer.wait_new(ANGLE_URI, TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise RuntimeError(
+            "No telemetry from the emulator in {} s.".format(TIMEOUT_S)
+        ) from None
+
+
+def bench_http(emulator, requests):
+    """Round trip time of GET and POST requests through _HTTPResourcer."""
+    resourcer = _HTTPResourcer("127.0.0.1", emulator.port, 2)
+    results = {}
+    try:
+        for verb, call in (
+            ("get", lambda: resourcer.get("/telemetry/period")),
+            ("post", lambda: resourcer.post("/test/resource", "bench")),
+        ):
+            samples = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                call()
+                samples.append(time.perf_counter() - start)
+            results[verb] = summarize(samples)
+    finally:
+        resourcer.close()
+    return results
+
+
+def bench_http_urls(requests):
+    """CPU cost of building the URL of a GET and a POST request, on every
+    request or with the URLs compiled beforehand, without any network."""
+    urls = _compile_urls(DUTY_URI)
+    results = []
+    for compiled, get, post in (
+        (
+            False,
+            lambda: _verb_url("GET", DUTY_URI),
+            lambda value: _verb_url("POST", _value_url(DUTY_URI, value)),
+        ),
+        (True, lambda: urls.get, urls.post),
+    ):
+        result = {"compiled": compiled}
+        for verb, call in (("get", get), ("post", lambda: post(42.5))):
+            start = time.perf_counter()
+            for _ in range(requests):
+                call()
+            elapsed = time.perf_counter() - start
+            result[verb + "_per_request_us"] = elapsed / requests * 1e6
+        results.append(result)
+    return results
+
+
+def bench_ws_decode(messages, binary=False):
+    """CPU cost of storing and decoding one telemetry message, without any
+    network."""
+    resourcer = _WSResourcer("127.0.0.1", 80, 1, "last")
+    resourcer._connected = True
+    message = Emulator(binary=binary).telemetry_message()
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        resourcer._on_message(message)
+        resourcer.get(ANGLE_URI)
+    elapsed = time.perf_counter() - start
+    return {
+        "format": "binary" if binary else "json",
+        "messages": messages,
+        "per_message_us": elapsed / messages * 1e6,
+        "messages_per_s": messages / elapsed,
+    }
+
+
+async def bench_ws_receive(emulator, period_ms, duration_s):
+    """Telemetry messages received per second, with the emulator sending
+    as fast as requested."""
+    http_resourcer = _HTTPResourcer("127.0.0.1", emulator.port, 2)
+    try:
+        http_resourcer.post("/telemetry/period", period_ms)
+    finally:
+        http_resourcer.close()
+    resourcer = _WSResourcer("127.0.0.1", emulator.port, 1, "new")
+    try:
+        await wait_telemetry(resourcer)
+
+        # many messages may arrive between two wake ups, so they are
+        # counted by the resourcer
+        received = resourcer.telemetry_stats().messages
+        sent = emulator.telemetry_messages
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration_s:
+            await wait_telemetry(resourcer)
+        elapsed = time.perf_counter() - start
+        received = resourcer.telemetry_stats().messages - received
+        sent = emulator.telemetry_messages - sent
+    finally:
+        await resourcer.close()
+    # only the messages on the way at the start and at the end may differ
+    if abs(received - sent) > max(2, sent // 100):
+        raise RuntimeError(
+            "Received {} telemetry messages, but the emulator sent {}."
+            .format(received, sent)
+        )
+    return {
+        "period_ms": period_ms,
+        "expected_per_s": 1000 / period_ms,
+        "sent_per_s": sent / elapsed,
+        "received_per_s": received / elapsed,
+    }
+
+
+async def bench_post_latency(emulator, samples):
+    """Time between a websocket post and the emulator receiving it."""
+    resourcer = _WSResourcer("127.0.0.1", emulator.port, 1, "new")
+    try:
+        await wait_telemetry(resourcer)
+
+        latencies = []
+        for i in range(samples):
+            commands = emulator.commands
+            start = time.monotonic()
+            resourcer.post(DUTY_URI, i % 50)
+            while emulator.commands == commands:
+                if time.monotonic() - start > TIMEOUT_S:
+                    raise RuntimeError(
+                        "The emulator did not receive command {} in {} s."
+                        .format(i, TIMEOUT_S)
+                    )
+                await asyncio.sleep(0)
+            latencies.append(emulator.last_command_ts - start)
+    finally:
+        await resourcer.close()
+    return summarize(latencies)
+
+
+class EmptyExperiment(Experiment):
+    def before_the_loop(self):
+        pass
+
+    def in_the_loop(self):
+        pass
+
+    def after_the_loop(self):
+        pass
+
+
+def bench_loop(frequencies_hz, run_time_s):
+    """Timing of an empty control-loop, for each frequency and clock."""
+    results = []
+    for clock in (MonotonicClock, HybridClock):
+        for frequency_hz in frequencies_hz:
+            exp = EmptyExperiment()
+            exp.set_loop_frequency(frequency_hz)
+            exp.set_before_loop_time(0)
+            exp.set_run_time(run_time_s)
+            exp.set_scheduler("absolute")
+            exp.set_clock(clock())
+            exp.run()
+
+            stats = exp.get_loop_stats(percentiles=(50, 99))
+            results.append({
+                "clock": clock.__name__,
+                "frequency_hz": frequency_hz,
+                "achieved_hz": 1 / stats.mean_period_s,
+                "lateness_p50_us": stats.lateness_percentiles_s[50] * 1e6,
+                "lateness_p99_us": stats.lateness_percentiles_s[99] * 1e6,
+                "max_jitter_us": stats.max_jitter_s * 1e6,
+                "overruns": stats.overruns,
+                "cpu_usage": exp.clock.cpu_usage,
+            })
+    return results
+
+
+def run(args):
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    loop = asyncio.get_event_loop()
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+    }
+    try:
+        with Emulator() as emulator:
+            results["http"] = bench_http(emulator, args.requests)
+            results["http_urls"] = bench_http_urls(args.messages)
+            results["ws_decode"] = [
+                bench_ws_decode(args.messages, binary)
+                for binary in (False, True)
+            ]
+            results["ws_receive"] = [
+                loop.run_until_complete(
+                    bench_ws_receive(emulator, period_ms, args.duration)
+                )
+                for period_ms in (20, 5, 1)
+            ]
+            results["ws_post_latency"] = loop.run_until_complete(
+                bench_post_latency(emulator, args.requests)
+            )
+        results["loop"] = bench_loop(
+            (50, 100, 200, 500, 1000), args.duration
+        )
+    finally:
+        loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--output",
+        help="file to write the JSON results, by default stdout",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="requests per HTTP and websocket latency benchmark",
+    )
+    parser.add_argument(
+        "--messages",
+        type=int,
+        default=100000,
+        help="messages decoded in the websocket decode benchmark",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=2,
+        help="duration [s] of each timed benchmark",
+    )
+    args = parser.parse_args()
+
+    output = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,25 +13,30 @@ class MyExperiment(Experiment):
     def before_the_loop(self):
         # we will use aero to comunicate with the system
         self.aero = System("aeropendulum")
-        self.aero.propeller.pwm.status.post("initialized")
-        self.aero.telemetry.period.post(20)
-        self.aero.logger.level.post("LOG_INFO")
+        # all at once, instead of one request after the other
+        self.aero.configure({
+            "/propeller/pwm/status": "initialized",
+            "/telemetry/period": 20,
+            "/logger/level": "LOG_INFO",
+        })
         self.angle = []
         self.time = []
-        self.aero.sensors.encoder.angle.get()
+        # run the loop each time a new angle arrives
+        self.set_loop_trigger(self.aero.sensors.encoder.angle.wait_new)
         self.start_ts = time.monotonic()
 
     def in_the_loop(self):
-        if self.aero.sensors.encoder.angle._Endpoint__resourcer.new_message:
-            angle = self.aero.sensors.encoder.angle.get()
-            self.time.append(time.monotonic() - self.start_ts)
-            self.angle.append(angle)
-            print(angle)
-            if angle is not None:
-                if angle < self.setpoint_deg:
-                    self.aero.propeller.pwm.duty.post(self.duty_high)
-                else:
-                    self.aero.propeller.pwm.duty.post(self.duty_low)
+        angle = self.aero.sensors.encoder.angle.get()
+        # the sample may be consumed already, or the trigger timed out
+        if angle is None:
+            return
+        self.time.append(time.monotonic() - self.start_ts)
+        self.angle.append(angle)
+        print(angle)
+        if angle < self.setpoint_deg:
+            self.aero.propeller.pwm.duty.post(self.duty_high)
+        else:
+            self.aero.propeller.pwm.duty.post(self.duty_low)
 
     # the after script will be executed even on failure
     def after_the_loop(self):
@@ -4,7 +4,7 @@ import time
 import numpy as np
 
 from nyquist.lab import System
-from nyquist.control import Experiment
+from nyquist.control import Experiment, LogWriter, Recorder
 
 
 def is_steady(values, ts_s, steady_time_s, margin):
@@ -80,13 +80,18 @@ def coeffs_analysis(angles, duties, plot=False):
 class MyExperiment(Experiment):
     def before_the_loop(self):
         self.aero = System("aeropendulum")
-        self.aero.propeller.pwm.status.post("initialized")
-        self.aero.telemetry.period.post(50)
-        self.aero.logger.level.post("LOG_WARN")
+        self.aero.configure({
+            "/propeller/pwm/status": "initialized",
+            "/telemetry/period": 50,
+            "/logger/level": "LOG_WARN",
+        })
         self.angle_buffer = []
-        self.angles = []
-        self.time = []
-        self.duties = []
+        self.steps = Recorder(('angle', 'duty'), capacity=100)
+        # every sample goes to disk while running, read it with LogReader
+        self.log = LogWriter(
+            f'calibration_{time.time()}.nyq',
+            ('time', 'angle', 'duty'),
+        )
         self.aero.sensors.encoder.angle.get()
         self.aero.propeller.pwm.duty.post(self.duty_start)
         self.prev_duty = self.duty_start
@@ -104,6 +109,11 @@ class MyExperiment(Experiment):
                 self.set_run_time(0)
                 return None
 
+            self.log.record(
+                time=time.monotonic() - self.start_ts,
+                angle=angle,
+                duty=self.prev_duty,
+            )
             self.angle_buffer.append(angle)
             steady = is_steady(
                 self.angle_buffer,
@@ -112,11 +122,10 @@ class MyExperiment(Experiment):
                 self.steady_margin_deg,
             )
             if steady:
-                self.duties.append(self.prev_duty)
+                self.steps.record(angle=angle, duty=self.prev_duty)
                 self.iteration += 1
 
                 self.angle_buffer = []
-                self.angles.append(angle)
 
                 duty = self.duty_start + self.iteration * self.duty_step
                 self.aero.propeller.pwm.duty.post(duty)
@@ -128,7 +137,8 @@ class MyExperiment(Experiment):
         self.aero.propeller.pwm.duty.post(0)
         self.aero.propeller.pwm.status.post("disabled")
         self.aero.propeller.pwm.status.post("initialized")
-        coeffs_analysis(self.angles, self.duties, plot=True)
+        self.log.close()
+        coeffs_analysis(self.steps['angle'], self.steps['duty'], plot=True)
 
 
 exp = MyExperiment()
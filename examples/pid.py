@@ -1,11 +1,10 @@
-import csv
 import time
 
 import numpy as np
 import matplotlib.pyplot as plt
 
 from nyquist.lab import System
-from nyquist.control import Experiment
+from nyquist.control import Experiment, Recorder
 
 
 MIN_ANGLE = 22.0
@@ -106,10 +105,15 @@ class MyExperiment(Experiment):
 
     def before_the_loop(self):
         self.aero = System("aeropendulum")
-        self.aero.propeller.pwm.status.post("initialized")
-        self.aero.telemetry.period.post(20)
-        self.aero.logger.level.post("LOG_INFO")
-        self.data = []  # {'time': %f, 'angle': %f, 'setpoint': %f}
+        self.aero.configure({
+            "/propeller/pwm/status": "initialized",
+            "/telemetry/period": 20,
+            "/logger/level": "LOG_INFO",
+        })
+        self.data = Recorder.for_experiment(
+            self,
+            ('time', 'sin_angle', 'duty', 'sin_setpoint'),
+        )
 
         pid_coeffs = ziegler_nichols(
             Ku=40,
@@ -147,13 +151,11 @@ class MyExperiment(Experiment):
         duty = safety_check(duty, self.max_duty, SAFE_DUTY)
         self.aero.propeller.pwm.duty.post(duty)
 
-        self.data.append(
-            {
-                'time': spent,
-                'sin_angle': np.sin(angle_rad),
-                'duty': duty,
-                'sin_setpoint': np.sin(self.setpoint_rad),
-            }
+        self.data.record(
+            time=spent,
+            sin_angle=np.sin(angle_rad),
+            duty=duty,
+            sin_setpoint=np.sin(self.setpoint_rad),
         )
 
     def after_the_loop(self):
@@ -167,18 +169,17 @@ exp = MyExperiment()
 exp.setpoint_rad = np.deg2rad(50)
 exp.max_duty = 55
 exp.set_loop_frequency(20)
+exp.set_scheduler("absolute")
 exp.set_run_time(20)
 exp.set_before_loop_time(2)
 exp.run()
 
-if exp.data:
-    with open(f'pid_{time.time()}.csv', 'w') as f:
-        fieldnames = exp.data[0].keys()
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writerows(exp.data)
-
-time, sin_angle, duty, sin_setpoint = zip(*[d.values() for d in exp.data])
+if len(exp.data):
+    exp.data.to_csv(f'pid_{time.time()}.csv')
 
 plt.figure()
-plt.plot(time, sin_angle, ".", time, sin_setpoint)
+plt.plot(
+    exp.data['time'], exp.data['sin_angle'], ".",
+    exp.data['time'], exp.data['sin_setpoint'],
+)
 plt.show()
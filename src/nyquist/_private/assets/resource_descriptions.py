@@ -1,4 +1,11 @@
-from nyquist._private.network.base import _Resource
+from nyquist._private.network.base import _Codec, _Resource
+
+
+_AERO_START_ANGLE_DEG = 22
+_AERO_DEGREE_PER_PULSE = 0.0625
+_AERO_DUTY_ZERO = 0x1D6A
+_AERO_DUTY_MAX = 0x2710
+_AERO_PERCENT_PER_DUTY = 100 / (_AERO_DUTY_MAX - _AERO_DUTY_ZERO)
 
 
 _AEROPENDULUM_HTTP_RESOURCES = (
@@ -84,9 +91,16 @@ _AEROPENDULUM_WS_RESOURCES = (
 
             Is likely that you will receive a None the first time calling this
             method, so better call it in the after_script, so is ready in
-            the control loop.
+            the control loop. Or await "wait_new()", that returns as soon as
+            a new value arrives.
             """
-        )
+        ),
+        codec=_Codec(
+            key="angle",
+            format="hex",
+            scale=_AERO_DEGREE_PER_PULSE,
+            offset=_AERO_START_ANGLE_DEG,
+        ),
     ),
     _Resource(
         uri="/propeller/pwm/duty",
@@ -101,7 +115,13 @@ _AEROPENDULUM_WS_RESOURCES = (
             Of course, this applies only to the first call on any of those
             methods.
             """
-        )
+        ),
+        codec=_Codec(
+            key="duty",
+            format="hex",
+            scale=_AERO_PERCENT_PER_DUTY,
+            offset=-_AERO_DUTY_ZERO * _AERO_PERCENT_PER_DUTY,
+        ),
     ),
 )
 """
@@ -169,12 +189,14 @@ _MOTOR_ENCODER_WS_RESOURCES = (
 
             Is likely that you will receive a None the first time calling this
             method, so better call it in the after_script, so is ready in
-            the control loop.
+            the control loop. Or await "wait_new()", that returns as soon as
+            a new value arrives.
             """
-        )
+        ),
+        codec=_Codec(key="angle", format="float"),
     ),
     _Resource(
-        uri="/steam/duty",
+        uri="/stream/duty",
         methods=["POST"],
         docs=(
             """The motor pwm duty percentage [0 to 100].
@@ -186,7 +208,8 @@ _MOTOR_ENCODER_WS_RESOURCES = (
             Of course, this applies only to the first call on any of those
             methods.
             """
-        )
+        ),
+        codec=_Codec(key="duty", format="float"),
     ),
 )
 """
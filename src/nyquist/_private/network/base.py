@@ -1,5 +1,12 @@
+import re
+import struct
 from collections import namedtuple
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class _Void:
     """A void class, a simple object.
@@ -15,7 +22,13 @@ class _Endpoint:
     The goal of an entire URI, the resource. When this class is instanced, it
     will look into the resource.methods, if existent it will create attributes
     for itself, linking to :meth:`_Resourcer.get` or :meth:`_Resourcer.post`
-    respectively.
+    respectively. Resources that can be read from a stream also get a
+    ``wait_new`` coroutine, and ``get_since``, ``subscribe``,
+    ``unsubscribe``, ``age`` and ``telemetry_stats`` methods, linking to the
+    methods of the resourcer with the same name. If the resourcer can
+    request without blocking the event loop, there are also ``get_async``
+    and ``post_async`` coroutines. The URLs of the requests to the resource
+    are built once, if the resourcer supports it.
 
 
     :param resourcer: An instance of :class:`_Resourcer`.
@@ -29,23 +42,209 @@ class _Endpoint:
         self.__resourcer = resourcer
 
         setattr(self, "help", self.__help_me)
+        if hasattr(resourcer, "compile_urls"):
+            resourcer.compile_urls(self.__uri)
 
         if "GET" in resource.methods:
             setattr(self, "get", self.__get_res)
+            if hasattr(resourcer, "get_async"):
+                setattr(self, "get_async", self.__get_async_res)
+            if hasattr(resourcer, "wait_new"):
+                setattr(self, "wait_new", self.__wait_new_res)
+            if hasattr(resourcer, "get_since"):
+                setattr(self, "get_since", self.__get_since_res)
+            if hasattr(resourcer, "subscribe"):
+                setattr(self, "subscribe", self.__subscribe_res)
+                setattr(self, "unsubscribe", self.__unsubscribe_res)
+            if hasattr(resourcer, "age"):
+                setattr(self, "age", self.__age_res)
+                setattr(self, "telemetry_stats", resourcer.telemetry_stats)
         if "POST" in resource.methods:
             setattr(self, "post", self.__post_res)
+            if hasattr(resourcer, "post_async"):
+                setattr(self, "post_async", self.__post_async_res)
 
     def __get_res(self):
         return self.__resourcer.get(self.__uri)
 
+    async def __get_async_res(self):
+        return await self.__resourcer.get_async(self.__uri)
+
+    async def __wait_new_res(self, timeout=None):
+        return await self.__resourcer.wait_new(self.__uri, timeout)
+
+    def __get_since_res(self, seq=0):
+        return self.__resourcer.get_since(self.__uri, seq)
+
+    def __subscribe_res(self, callback):
+        return self.__resourcer.subscribe(self.__uri, callback)
+
+    def __unsubscribe_res(self, callback):
+        return self.__resourcer.unsubscribe(self.__uri, callback)
+
+    def __age_res(self):
+        return self.__resourcer.age(self.__uri)
+
     def __post_res(self, value):
         return self.__resourcer.post(self.__uri, value)
 
+    async def __post_async_res(self, value):
+        return await self.__resourcer.post_async(self.__uri, value)
+
     def __help_me(self):
         print(self.__docs)
 
 
-_Resource = namedtuple("Resource", ["uri", "methods", "docs"])
+def _generate_tree(obj, resourcer, iterable_path, resource):
+    """Create the attributes of an object that lead to the endpoint of a
+    resource, one per word of the uri, e.g. ``obj.sensors.encoder.angle``.
+
+    :param obj: The root of the tree.
+    :param resourcer: The resourcer of the endpoint.
+    :param iterable_path: The words of the uri, it's consumed.
+    :type iterable_path: list
+    :param resource: The resource.
+    :type resource: :class:`_Resource`
+    """
+    for subresource in iterable_path:
+        if not hasattr(obj, subresource):
+            if len(iterable_path) == 1:
+                setattr(obj, subresource, _Endpoint(resourcer, resource))
+            else:
+                setattr(obj, subresource, _Void())
+        iterable_path.pop(0)
+        _generate_tree(
+            getattr(obj, subresource),
+            resourcer,
+            iterable_path,
+            resource
+        )
+
+
+_Codec = namedtuple(
+    "Codec",
+    ["key", "format", "scale", "offset", "binary"],
+    defaults=("float", 1, 0, None),
+)
+"""How a websocket resource travels in the telemetry and command messages.
+
+The value is sent under ``key`` in a JSON object, as a hex string
+(``"hex"``, e.g. ``"0x1E61"``), an integer (``"int"``) or a float
+(``"float"``). The raw value is converted to the units of the resource as
+``value = raw * scale + offset``. Websocket resources without a codec are
+floats, under the last word of their uri.
+
+Devices can also send compact binary frames instead of JSON, see
+:func:`_binary_frame`. ``binary`` is the :mod:`struct` format of the raw
+value in those frames, by default a 32 bit integer for hex and int values,
+and a double for float values.
+"""
+
+
+_BINARY_FORMATS = {"hex": "i", "int": "i", "float": "d"}
+
+
+_Resource = namedtuple(
+    "Resource",
+    ["uri", "methods", "docs", "codec"],
+    defaults=(None, ),
+)
+
+
+def _compile_codec(codec):
+    """Build the functions that convert a resource to and from its raw
+    value, once, so decoding a message does no lookups nor comparisons.
+
+    :param codec: The codec of the resource.
+    :type codec: :class:`_Codec`
+
+    :return: The decode function, from the raw JSON value to the value of
+             the resource, and the encode function, from the value of the
+             resource to the raw JSON value. Hex and int raw values are
+             truncated, as the device expects.
+    :rtype: tuple
+    """
+    scale = codec.scale
+    offset = codec.offset
+    if codec.format == "hex":
+        def parse(raw):
+            return int(raw, 16)
+
+        def unparse(raw):
+            return "0x{:X}".format(int(raw))
+    elif codec.format == "int":
+        parse = int
+        unparse = int
+    elif codec.format == "float":
+        parse = float
+        unparse = float
+    else:
+        raise ValueError(
+            "{} is not a valid codec format.".format(codec.format)
+        )
+
+    if scale == 1 and offset == 0:
+        return parse, unparse
+
+    def decode(raw):
+        return parse(raw) * scale + offset
+
+    def encode(value):
+        return unparse((value - offset) / scale)
+    return decode, encode
+
+
+def _compile_extractor(codec):
+    """Build a function that finds the raw value of a resource in a JSON
+    telemetry message. If :mod:`orjson` is installed the message is parsed
+    with it, otherwise the value is searched without parsing the whole
+    message: telemetry messages are flat JSON objects, so a regular
+    expression is enough, and much faster than :func:`json.loads`.
+
+    :param codec: The codec of the resource.
+    :type codec: :class:`_Codec`
+
+    :return: A function that returns the raw value, or None if the message
+             does not have it or it's null.
+    :rtype: callable
+    """
+    if orjson is not None:
+        loads = orjson.loads
+        key = codec.key
+
+        def extract(message):
+            return loads(message).get(key)
+        return extract
+
+    search = re.compile(
+        r'"{}"\s*:\s*(?:"([^"]*)"|([^,}}\s]+))'.format(re.escape(codec.key))
+    ).search
+
+    def extract(message):
+        match = search(message)
+        if match is None:
+            return None
+        string, number = match.groups()
+        if string is not None:
+            return string
+        # as parsed by orjson
+        return None if number == "null" else number
+    return extract
+
+
+def _binary_frame(codecs):
+    """The layout of a binary telemetry frame: the raw values of every
+    streamed resource, in the order of the description, little endian and
+    without padding.
+
+    :param codecs: The codecs of the streamed resources.
+    :type codecs: tuple of :class:`_Codec`
+
+    :rtype: :class:`struct.Struct`
+    """
+    return struct.Struct("<" + "".join(
+        codec.binary or _BINARY_FORMATS[codec.format] for codec in codecs
+    ))
 
 
 _SystemDescription = namedtuple(
@@ -57,6 +256,7 @@ _SystemDescription = namedtuple(
         "http_timeout",
         "ws_timeout",
         "ws_get_mode",
+        "ws_history",
         "http_resources",
         "ws_resources",
     ]
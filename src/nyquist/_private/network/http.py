@@ -1,10 +1,111 @@
-from http.client import HTTPConnection
-from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+import asyncio
+import queue
+import select
+import threading
+from http.client import (
+    CannotSendRequest,
+    HTTPConnection,
+    HTTPException,
+    ResponseNotReady,
+)
+from collections import namedtuple
+from urllib.parse import (
+    parse_qsl,
+    quote_plus,
+    urlencode,
+    urlparse,
+    urlunparse,
+)
+
+
+_RETRIABLE_ERRORS = (
+    CannotSendRequest,
+    ResponseNotReady,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+    asyncio.IncompleteReadError,
+)
+"""Errors of a request sent through a connection the server already closed,
+e.g. an idle keep-alive connection, that are worth a retry with a new one.
+"""
+
+_HARDCODED_SUPPORTED_METHOD = "GET"
+
+
+def _verb_url(method, url):
+    """Add the HTTP method to the query of an URL, as ``?verb=``, see
+    :meth:`_HTTPConnection.request`.
+    """
+    # decode
+    parsed_url = urlparse(url)
+
+    if (not parsed_url.path) or (parsed_url.path == "/"):
+        return url
+    query_elements = parse_qsl(parsed_url.query)
+
+    # add method
+    query_elements.append(('verb', method))
+
+    # re encode
+    updated_query = urlencode(query_elements)
+    updated_parsed_url = parsed_url._replace(query=updated_query)
+    return urlunparse(updated_parsed_url)
+
+
+def _value_url(resource, value):
+    """Set the value to post to a resource as the query of its URL."""
+    parsed_resource = urlparse(resource)
+
+    q = urlencode([("value", value)])
+    resource_with_query = parsed_resource._replace(query=q)
+    return urlunparse(resource_with_query)
+
+
+_URLs = namedtuple("URLs", ["get", "post"])
+"""The URLs of the requests to a resource, built beforehand by
+:func:`_compile_urls`: the URL of the GET requests, and a function that
+gives the URL of a POST request from the value.
+"""
+
+_VALUE_PLACEHOLDER = "nyquistvalueplaceholder"
+
+
+def _compile_urls(resource):
+    """Build the URLs of the requests to a resource once, exactly as
+    :func:`_verb_url` and :func:`_value_url` would on every request, so
+    only the value is encoded when posting.
+
+    :param resource: The uri of the resource.
+    :type resource: str
+
+    :rtype: :class:`_URLs`
+    """
+    get_url = _verb_url("GET", resource)
+    post_prefix, post_suffix = _verb_url(
+        "POST", _value_url(resource, _VALUE_PLACEHOLDER)
+    ).rsplit(_VALUE_PLACEHOLDER, 1)
+    # blank values are dropped when adding the verb
+    blank_post_url = _verb_url("POST", _value_url(resource, ""))
+
+    def post_url(value):
+        if not isinstance(value, (str, bytes)):
+            value = str(value)
+        encoded = quote_plus(value)
+        if not encoded:
+            return blank_post_url
+        return post_prefix + encoded + post_suffix
+
+    return _URLs(get_url, post_url)
 
 
 class _HTTPConnection:
     """A nice way to handle HTTP requests.
 
+    The connection is kept alive between requests. Before each request,
+    whatever was not read of the previous response is drained, and if the
+    server closed the connection meanwhile, it's reopened.
+
     :param ip: Host's IP/Domain.
     :type ip: str
     :param port: Destination port.
@@ -14,8 +115,9 @@ class _HTTPConnection:
     """
     def __init__(self, ip, port, timeout):
         self.con = HTTPConnection(ip, port=port, timeout=timeout)
+        self._response = None
 
-    def request(self, method, url):
+    def request(self, method, url, verb_url=None):
         """Masks the communication with the server.
         The object has already been instanced with the host's address, port
         and timeout. Given that information and the provided URL the
@@ -44,34 +146,200 @@ class _HTTPConnection:
         :type method: str
         :param url: Destination's URL, composed with a resource and it's query.
         :type url: str
+        :param verb_url: The URL with the method already added, if it was
+                         built beforehand (see :func:`_compile_urls`), then
+                         it's sent instead.
+        :type verb_url: str
+        """
+        if verb_url is None:
+            verb_url = _verb_url(method, url)
+        self._drain()
+        self._close_if_dead()
+        self.con.request(_HARDCODED_SUPPORTED_METHOD, verb_url)
+
+    def getresponse(self):
+        """Wrapper to avoid accessing "con" (as in connection) member.
+
+        :return: The response of the last request.
+        :rtype: string
         """
-        HARDCODED_SUPPORTED_METHOD = "GET"
+        self._response = self.con.getresponse()
+        return self._response
 
-        # decode
-        parsed_url = urlparse(url)
+    def _drain(self):
+        """Read what is left of the last response, otherwise the connection
+        can not be reused.
+        """
+        response, self._response = self._response, None
+        if response is None or response.isclosed():
+            return
+        try:
+            response.read()
+        except (OSError, HTTPException):
+            self.con.close()
+
+    def _close_if_dead(self):
+        """Close the connection if the server closed it. Nothing is expected
+        from an idle connection, so if it's readable the server either
+        closed it or broke the protocol.
+        """
+        sock = self.con.sock
+        if sock is None:
+            return
+        readable, _, _ = select.select([sock], [], [], 0)
+        if readable:
+            self.con.close()
+
+    def close(self):
+        """Close the connection, the next request will open a new one."""
+        self._response = None
+        self.con.close()
+
+
+class _AsyncHTTPResponse:
+    """The response of an :class:`_AsyncHTTPConnection`, read as a whole.
+    Like :class:`http.client.HTTPResponse`, it has a ``code``, a
+    ``reason``, the ``headers`` (lowercase) and a :meth:`read` method.
+    """
+    def __init__(self, code, reason, headers, body):
+        self.code = self.status = code
+        self.reason = reason
+        self.headers = headers
+        self._body = body
 
-        if (not parsed_url.path) or (parsed_url.path == "/"):
-            updated_url = url
-        else:
-            query_elements = parse_qsl(parsed_url.query)
+    def read(self):
+        """The body of the response.
 
-            # add method
-            query_elements.append(('verb', method))
+        :rtype: bytes
+        """
+        return self._body
 
-            # re encode
-            updated_query = urlencode(query_elements)
-            updated_parsed_url = parsed_url._replace(query=updated_query)
-            updated_url = urlunparse(updated_parsed_url)
 
-        self.con.request(HARDCODED_SUPPORTED_METHOD, updated_url)
+class _AsyncHTTPConnection:
+    """The awaitable counterpart of :class:`_HTTPConnection`, over asyncio
+    streams, so a request never blocks the event loop (e.g. the telemetry
+    reception of the websocket).
 
-    def getresponse(self):
-        """Wrapper to avoid accessing "con" (as in connection) member.
+    It speaks just enough HTTP/1.1 for the lab servers: every request is a
+    GET following the same ``?verb=`` convention, see
+    :meth:`_HTTPConnection.request`, and the connection is kept alive
+    unless the server closes it.
 
-        :return: The response of the last request.
-        :rtype: string
+    :param ip: Host's IP/Domain.
+    :type ip: str
+    :param port: Destination port.
+    :type port: int
+    """
+    def __init__(self, ip, port):
+        self._ip = ip
+        self._port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, url, verb_url=None):
+        """Send a request, opening the connection if the server closed it.
+
+        :param method: HTTP verb, representing the communication method.
+        :type method: str
+        :param url: Destination's URL, composed with a resource and it's query.
+        :type url: str
+        :param verb_url: The URL with the method already added, see
+                         :meth:`_HTTPConnection.request`.
+        :type verb_url: str
+        """
+        if verb_url is None:
+            verb_url = _verb_url(method, url)
+        if (
+            self._writer is None or
+            self._reader.at_eof() or
+            self._writer.is_closing()
+        ):
+            self.close()
+            self._reader, self._writer = await asyncio.open_connection(
+                self._ip, self._port
+            )
+        self._writer.write((
+            "{} {} HTTP/1.1\r\n"
+            "Host: {}:{}\r\n"
+            "Accept-Encoding: identity\r\n"
+            "\r\n"
+        ).format(
+            _HARDCODED_SUPPORTED_METHOD,
+            verb_url,
+            self._ip,
+            self._port,
+        ).encode("latin-1"))
+        await self._writer.drain()
+
+    async def getresponse(self):
+        """Read the response of the last request.
+
+        :rtype: :class:`_AsyncHTTPResponse`
         """
-        return self.con.getresponse()
+        reader = self._reader
+        status_line = await reader.readline()
+        if not status_line:
+            self.close()
+            raise ConnectionResetError("The server closed the connection.")
+        version, code, reason = (
+            status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) +
+            [""]
+        )[:3]
+        if not version.startswith("HTTP/") or not code.isdigit():
+            self.close()
+            raise HTTPException("Invalid status line {!r}.".format(
+                status_line
+            ))
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (
+            version == "HTTP/1.1" and
+            headers.get("connection", "").lower() != "close"
+        )
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunks()
+        else:
+            # delimited by the end of the connection
+            body = await reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            self.close()
+        return _AsyncHTTPResponse(int(code), reason, headers, body)
+
+    async def _read_chunks(self):
+        chunks = []
+        while True:
+            size_line = await self._reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if not size:
+                break
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readline()
+        # trailers
+        while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+    def close(self):
+        """Close the connection, the next request will open a new one."""
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is None:
+            return
+        try:
+            writer.close()
+        except RuntimeError:
+            # its event loop is already closed
+            pass
 
 
 class _HTTPResourcer(_HTTPConnection):
@@ -84,16 +352,176 @@ class _HTTPResourcer(_HTTPConnection):
     The parameters are the same as in :class:`_HTTPConnection`, and are
     supercharged to it.
 
+    Requests that fail because the server closed the connection are retried
+    with a new connection. Concurrent callers (e.g. from different threads)
+    get a connection each, from a small pool of persistent connections.
+
+    :meth:`get_async` and :meth:`post_async` are awaitable versions of
+    :meth:`get` and :meth:`post`, over :class:`_AsyncHTTPConnection`, to
+    use from coroutines (e.g. async hooks of an
+    :class:`~nyquist.control.Experiment`) without blocking the event loop.
+    They have their own pool, of the same size, for the running event loop.
+    The blocking methods do not wrap the coroutines: they are called from
+    the hooks, inside the running event loop, where a coroutine can not be
+    run to completion. Both share the URLs and the retry policy.
+
     :param ip: Host's IP/Domain.
     :type ip: str
     :param port: Destination port.
     :type port: int
     :param timeout: A timeout [s] for each request.
     :type timeout: float
+    :param pool_size: The maximum amount of connections.
+    :type pool_size: int
+    :param retries: The times a request is retried after a connection
+                    error.
+    :type retries: int
     """
 
-    def __init__(self, ip, port, timeout):
+    def __init__(self, ip, port, timeout, pool_size=4, retries=1):
         super().__init__(ip, port, timeout)
+        self._address = (ip, port, timeout)
+        self._retries = retries
+        self._pool_size = pool_size
+        # this connection is the first one of the pool, the rest are opened
+        # when there are concurrent requests
+        self._pool = queue.LifoQueue()
+        self._pool.put(self)
+        self._opened = 1
+        self._pool_lock = threading.Lock()
+        self._async_loop = None
+        self._async_idle = []
+        self._async_slots = None
+        self._urls = {}
+        self.reconnections = 0
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._opened < self._pool_size:
+                self._opened += 1
+                return _HTTPConnection(*self._address)
+        return self._pool.get()
+
+    def _roundtrip(self, method, url, retval_mode, verb_url=None):
+        """Send a request through a connection of the pool, retrying with a
+        new connection if the server closed it, and read the response.
+        """
+        connection = self._acquire()
+        try:
+            for attempt in range(self._retries + 1):
+                try:
+                    connection.request(method, url, verb_url)
+                    response = connection.getresponse()
+                    break
+                except _RETRIABLE_ERRORS:
+                    _HTTPConnection.close(connection)
+                    if not self._retry(attempt):
+                        raise
+            return self._retval(retval_mode, response)
+        finally:
+            self._pool.put(connection)
+
+    def _retry(self, attempt):
+        """Whether a request that failed because the server closed the
+        connection is sent again, through a new one. The same policy for
+        :meth:`_roundtrip` and :meth:`_async_roundtrip`.
+
+        :param attempt: The failed attempt, counting from zero.
+        :type attempt: int
+        """
+        if attempt == self._retries:
+            return False
+        self.reconnections += 1
+        return True
+
+    def compile_urls(self, resource):
+        """Build the URLs of the requests to a resource beforehand, so
+        :meth:`get` and :meth:`post` do not parse and encode them on every
+        request. Every endpoint of a :class:`~nyquist.lab.System` does it
+        for its resource.
+
+        :param resource: The uri of the resource.
+        :type resource: str
+        """
+        self._urls[resource] = _compile_urls(resource)
+
+    def _get_url(self, resource):
+        urls = self._urls.get(resource)
+        return urls.get if urls is not None else None
+
+    def _post_url(self, resource, value):
+        """The URL of a post, and the one with the method already added if
+        the resource was compiled.
+        """
+        urls = self._urls.get(resource)
+        if urls is None:
+            return _value_url(resource, value), None
+        return resource, urls.post(value)
+
+    def _async_pool(self):
+        """The idle connections and the free slots of the async pool, for
+        the running event loop. Connections of another (e.g. a closed) loop
+        can not be used.
+        """
+        loop = asyncio.get_event_loop()
+        if self._async_loop is not loop:
+            self._close_async()
+            self._async_loop = loop
+            self._async_slots = asyncio.Semaphore(self._pool_size)
+        return self._async_idle, self._async_slots
+
+    async def _async_roundtrip(self, method, url, retval_mode, verb_url=None):
+        """Like :meth:`_roundtrip`, through a connection of the async pool,
+        within the timeout.
+        """
+        idle, slots = self._async_pool()
+        async with slots:
+            if idle:
+                connection = idle.pop()
+            else:
+                connection = _AsyncHTTPConnection(*self._address[:2])
+            try:
+                response = await asyncio.wait_for(
+                    self.__async_request(connection, method, url, verb_url),
+                    self._address[2],
+                )
+            except BaseException:
+                connection.close()
+                raise
+            idle.append(connection)
+            return self._retval(retval_mode, response)
+
+    async def __async_request(self, connection, method, url, verb_url):
+        for attempt in range(self._retries + 1):
+            try:
+                await connection.request(method, url, verb_url)
+                return await connection.getresponse()
+            except _RETRIABLE_ERRORS:
+                connection.close()
+                if not self._retry(attempt):
+                    raise
+
+    def _close_async(self):
+        idle, self._async_idle = self._async_idle, []
+        for connection in idle:
+            connection.close()
+
+    def close(self):
+        """Close every idle connection of the pool."""
+        self._close_async()
+        connections = []
+        while True:
+            try:
+                connections.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for connection in connections:
+            _HTTPConnection.close(connection)
+            self._pool.put(connection)
 
     @staticmethod
     def _retval(mode, response):
@@ -123,8 +551,32 @@ class _HTTPResourcer(_HTTPConnection):
         :rtype: depends on the resource.
         """
         METHOD = "GET"
-        self.request(METHOD, resource)
-        return self._retval(retval_mode, self.getresponse())
+        return self._roundtrip(
+            METHOD,
+            resource,
+            retval_mode,
+            self._get_url(resource)
+        )
+
+    async def get_async(self, resource, retval_mode="payload"):
+        """Gets the value of a resource, without blocking the event loop.
+        See :meth:`get`.
+
+        :param resource: The resource whose value we want.
+        :type resource: string
+        :param retval_mode: The type of return value we expect.
+        :type retval_mode: string
+
+        :return: The value of the resource.
+        :rtype: depends on the resource.
+        """
+        METHOD = "GET"
+        return await self._async_roundtrip(
+            METHOD,
+            resource,
+            retval_mode,
+            self._get_url(resource)
+        )
 
     def post(self, resource, value, retval_mode="code"):
         """Gets the value of a resource.
@@ -142,12 +594,23 @@ class _HTTPResourcer(_HTTPConnection):
         :rtype: int
         """
         METHOD = "POST"
+        url, verb_url = self._post_url(resource, value)
+        return self._roundtrip(METHOD, url, retval_mode, verb_url)
 
-        parsed_resource = urlparse(resource)
+    async def post_async(self, resource, value, retval_mode="code"):
+        """Sets the value of a resource, without blocking the event loop.
+        See :meth:`post`.
 
-        q = urlencode([("value", value)])
-        resource_with_query = parsed_resource._replace(query=q)
-        unparsed_resource_with_query = urlunparse(resource_with_query)
-        self.request(METHOD, unparsed_resource_with_query)
+        :param resource: The resource whose value we want to set.
+        :type resource: string
+        :param value: The resource whose value we want to set.
+        :type value: depends on the resource
+        :param retval_mode: The type of return value we expect.
+        :type retval_mode: string
 
-        return self._retval(retval_mode, self.getresponse())
+        :return: The return code.
+        :rtype: int
+        """
+        METHOD = "POST"
+        url, verb_url = self._post_url(resource, value)
+        return await self._async_roundtrip(METHOD, url, retval_mode, verb_url)
@@ -1,83 +1,453 @@
 import asyncio
 import json
+import math
+import random
+import struct
+import time
+from collections import namedtuple
 
+import numpy as np
 import websockets
 
+from nyquist._private.assets.resource_descriptions import (
+    _AEROPENDULUM_WS_RESOURCES,
+)
+from nyquist._private.network.base import (
+    _Codec,
+    _binary_frame,
+    _compile_codec,
+    _compile_extractor,
+)
+
+
+_SAMPLE_DTYPE = np.dtype([
+    ("seq", np.int64),
+    ("timestamp", np.float64),
+    ("value", np.float64),
+])
+"""The samples returned by
+:meth:`~nyquist._private.network.ws._WSResourcer.get_since`: the sequence
+number of the message, its host receive time (:func:`time.monotonic`) and
+the decoded value.
+"""
+
+
+_TelemetryStats = namedtuple(
+    "TelemetryStats",
+    [
+        "messages",
+        "samples",
+        "period_s",
+        "mean_interval_s",
+        "max_interval_s",
+        "max_jitter_s",
+        "gaps",
+        "lost_messages",
+        "reads",
+        "mean_age_s",
+        "max_age_s",
+    ]
+)
+"""
+A summary of the telemetry reception, as returned by
+:meth:`~nyquist._private.network.ws._WSResourcer.telemetry_stats`. Every
+time is in seconds, measured with the host receive timestamps.
+
+- ``messages``: Messages received since the telemetry started.
+- ``samples``: Messages still available in the ring buffer, the interval
+  statistics are computed over these ones.
+- ``period_s``: The expected telemetry period.
+- ``mean_interval_s``: The mean time between two consecutive messages.
+- ``max_interval_s``: The maximum time between two consecutive messages.
+- ``max_jitter_s``: The maximum absolute difference between the time
+  between two messages and the period.
+- ``gaps``: Times two consecutive messages arrived more than one and a half
+  periods apart.
+- ``lost_messages``: The messages that should have arrived in those gaps.
+- ``reads``: Values returned by the resources since the telemetry started.
+- ``mean_age_s``: The mean age of those values when they were returned.
+- ``max_age_s``: The maximum age of those values when they were returned.
+"""
+
 
 class _WSResourcer():
-    def __init__(self, ip, port, timeout, get_mode):
+    def __init__(
+        self, ip, port, timeout, get_mode,
+        history=4096,
+        command_max_age=None,
+        reconnect_delay=0.1,
+        max_reconnect_delay=5,
+        resources=None,
+    ):
+        if get_mode not in ("new", "last", "all"):
+            raise ValueError(
+                "{} is not a valid get mode.".format(get_mode)
+            )
         self._connected = False
-        self._reconnecting = False
-        self._last_ws_message = None
-        self._uri = "ws://{}/stream".format(ip)
+        if port == 80:
+            self._uri = "ws://{}/stream".format(ip)
+        else:
+            self._uri = "ws://{}:{}/stream".format(ip, port)
         self._port = port
         self._timeout = timeout
         self._get_mode = get_mode
-        self._post_uri_resource_map = {
-            "/propeller/pwm/duty": "duty",
-        }
-        self._get_uri_resource_map = {
-            "/sensors/encoder/angle": "angle",
-        }
+        if resources is None:
+            resources = _AEROPENDULUM_WS_RESOURCES
+
+        # the codecs are compiled once, the uri of each resource maps to its
+        # conversion functions. Without a codec, the value is a float under
+        # the last word of the uri
+        self._decoders = {}
+        self._encoders = {}
+        self._streamed = []
+        binary_codecs = []
+        for resource in resources:
+            codec = resource.codec
+            if codec is None:
+                codec = _Codec(key=resource.uri.rsplit("/", 1)[-1])
+            decode, encode = _compile_codec(codec)
+            if "GET" in resource.methods:
+                self._decoders[resource.uri] = (
+                    _compile_extractor(codec),
+                    decode,
+                    len(binary_codecs),
+                    codec.scale,
+                    codec.offset,
+                )
+                binary_codecs.append(codec)
+                self._streamed.append(resource)
+            if "POST" in resource.methods:
+                self._encoders[resource.uri] = (codec.key, encode)
+        self._binary_frame = _binary_frame(binary_codecs)
         self.new_message = False
+        self._message_event = None
+        self._telemetry_task = None
+        self._connection_task = None
+        self._closing = False
+
+        # every received message is kept in a ring buffer, as it arrived.
+        # Each resource is decoded into its own ring buffer only when read
+        self._history = history
+        self._seq = 0
+        self._frames = [None] * history
+        self._timestamps = np.zeros(history)
+        self._values = {
+            resource: np.zeros(history) for resource in self._decoders
+        }
+        self._decoded_seq = dict.fromkeys(self._decoders, 0)
+        self._read_seq = dict.fromkeys(self._decoders, 0)
+        self._subscribers = {resource: [] for resource in self._decoders}
+        self._subscribed = ()
+        self._message_callbacks = []
+
+        # how old the returned values were
+        self._returned_ts = dict.fromkeys(self._decoders, math.nan)
+        self._reads = 0
+        self._age_sum = 0
+        self._age_max = 0
+
+        # only the newest pending command of each resource is kept, and a
+        # single task per connection sends them
+        self._command_max_age = command_max_age
+        self._pending = {}
+        self._send_event = None
+        self.sent_commands = 0
+        self.coalesced_commands = 0
+        self.dropped_commands = 0
+
+        # failed connections are retried with a jittered exponential backoff
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._connected_event = None
+        self._connect_callbacks = []
+        self._disconnect_callbacks = []
+        self.connections = 0
+        self.disconnections = 0
+        self.failed_connections = 0
 
     def __start_telemetry(self):
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.__gather_telemetry())
+        if self._telemetry_task is None or self._telemetry_task.done():
+            loop = asyncio.get_event_loop()
+            self._telemetry_task = loop.create_task(self.__gather_telemetry())
 
     async def __gather_telemetry(self):
-        async for ws in websockets.connect(self._uri):
+        failures = 0
+        while not self._closing:
+            # websockets ignores a cancellation that arrives while closing
+            # the connection, so each connection runs in its own task
+            connection = asyncio.ensure_future(self.__connect())
+            self._connection_task = connection
             try:
-                self._connected = True
-                self._reconnecting = False
+                received = await asyncio.shield(connection)
+            except asyncio.CancelledError:
+                connection.cancel()
+                raise
+            # only a device that sends telemetry resets the backoff
+            if received:
+                failures = 0
+            else:
+                failures += 1
+                self.failed_connections += 1
+            await asyncio.sleep(self._backoff(failures))
+
+    async def __connect(self):
+        """Receive telemetry until the connection fails.
+
+        :return: Whether any message was received.
+        :rtype: bool
+        """
+        received = False
+        try:
+            async with websockets.connect(self._uri) as ws:
                 self._ws = ws
-                while ws.open:
-                    message = await asyncio.wait_for(ws.recv(), self._timeout)
-                    self._last_ws_message = json.loads(message)
-                    self.new_message = True
-            except (
-                websockets.ConnectionClosed,
-                websockets.ConnectionClosedError,
-                asyncio.exceptions.TimeoutError
-            ):
-                self._reconnecting = True
-                continue
+                self.__set_connected(True)
+                sender = asyncio.ensure_future(self.__send_pending(ws))
+                try:
+                    while ws.open and not self._closing:
+                        message = await self.__receive(ws)
+                        try:
+                            self._on_message(message)
+                        except Exception as e:
+                            # a faulty message must not stop the telemetry
+                            self._report(
+                                "Exception handling a telemetry message",
+                                e
+                            )
+                        received = True
+                finally:
+                    sender.cancel()
+                    self.__set_connected(False)
+        except (
+            websockets.ConnectionClosed,
+            websockets.ConnectionClosedError,
+            websockets.InvalidHandshake,
+            asyncio.exceptions.TimeoutError,
+            OSError,
+        ):
+            pass
+        except Exception as e:
+            # anything else is reported, and the connection retried
+            self._report("Exception in the websocket telemetry", e)
+        return received
 
-        self._connected = False
+    async def __receive(self, ws):
+        """The next message, within the timeout.
 
-    async def __async_send(self, message):
-        while not self._connected or self._reconnecting:
-            await asyncio.sleep(self._timeout / 100)
-        await self._ws.send(message)
+        Unlike :func:`asyncio.wait_for`, which ignores a cancellation that
+        arrives while the message is being received (before Python 3.12),
+        this is always cancellable.
+        """
+        receive = asyncio.ensure_future(ws.recv())
+        try:
+            done, _ = await asyncio.wait({receive}, timeout=self._timeout)
+        finally:
+            if not receive.done():
+                receive.cancel()
+        if not done:
+            raise asyncio.TimeoutError()
+        return receive.result()
 
-    @staticmethod
-    def _aero_angle_to_deg(aero_angle):
-        start_angle_deg = 22
-        degree_per_pulse = 0.0625
-        return aero_angle * degree_per_pulse + start_angle_deg
+    def _backoff(self, failures):
+        """The time to wait before a reconnection attempt, after some
+        consecutive failures: it doubles with each failure, up to a maximum,
+        and is randomized so many clients do not retry at once.
+        """
+        delay = min(
+            self._reconnect_delay * 2 ** failures,
+            self._max_reconnect_delay
+        )
+        return random.uniform(delay / 2, delay)
 
-    @staticmethod
-    def _decode(message, resource):
-        if message is not None:
-            value = int(message[resource], 16)
-            if resource == "angle":
-                value = _WSResourcer._aero_angle_to_deg(value)
-            return value
+    def __set_connected(self, connected):
+        if self._connected_event is None:
+            self._connected_event = asyncio.Event()
+        self._connected = connected
+        if connected:
+            self.connections += 1
+            self._connected_event.set()
+            self._notify(self._connect_callbacks)
         else:
-            return message
+            self.disconnections += 1
+            self._connected_event.clear()
+            self._notify(self._disconnect_callbacks)
+
+    def _on_message(self, message):
+        """Store a telemetry message and wake up whoever is waiting for it.
+        The message is only decoded if some resource has subscribers.
+        """
+        index = self._seq % self._history
+        timestamp = time.monotonic()
+        self._frames[index] = message
+        self._timestamps[index] = timestamp
+        self._seq += 1
+        self.new_message = True
+        if self._message_event is not None:
+            # wakes up the current waiters only, the next ones will wait for
+            # the next message
+            self._message_event.set()
+            self._message_event.clear()
+        # each value is decoded once, even if many callbacks need it
+        message_callbacks = self._message_callbacks
+        decoded = {}
+        if message_callbacks:
+            decoded = {
+                resource: self._safe_decode_frame(message, resource)
+                for resource in self._decoders
+            }
+        for resource, callbacks in self._subscribed:
+            if resource in decoded:
+                value = decoded[resource]
+            else:
+                value = self._safe_decode_frame(message, resource)
+            if value is not None:
+                self._notify(callbacks, value, timestamp)
+        if message_callbacks:
+            self._notify(
+                message_callbacks,
+                self._seq - 1,
+                timestamp,
+                tuple(decoded.values())
+            )
+
+    def _decode_frame(self, frame, resource):
+        """The value of a resource in a telemetry message, either JSON or
+        binary, or None if the message does not have it.
+        """
+        extract, decode, field, scale, offset = self._decoders[resource]
+        if isinstance(frame, bytes):
+            return self._binary_frame.unpack(frame)[field] * scale + offset
+        raw = extract(frame)
+        if raw is None:
+            return None
+        return decode(raw)
+
+    def _safe_decode_frame(self, frame, resource):
+        """Like :meth:`_decode_frame`, but a value that can not be decoded
+        (e.g. null, or a short binary frame) is reported through the event
+        loop exception handler, and is None.
+        """
+        try:
+            return self._decode_frame(frame, resource)
+        except (ValueError, TypeError, struct.error) as e:
+            self._report(
+                "Can not decode {} from a telemetry message".format(resource),
+                e
+            )
+            return None
 
     @staticmethod
-    def _duty_percent_to_duty_aero(duty_percent):
-        duty_zero = 0x1D6A
-        duty_max = 0x2710
-        return (duty_percent / 100) * (duty_max - duty_zero) + duty_zero
+    def _notify(callbacks, *args):
+        loop = asyncio.get_event_loop()
+        for callback in tuple(callbacks):
+            try:
+                retval = callback(*args)
+                if asyncio.iscoroutine(retval):
+                    loop.create_task(retval)
+            except Exception as e:
+                # a faulty callback must not stop the telemetry
+                _WSResourcer._report("Exception in websocket callback", e)
 
     @staticmethod
-    def _encode(message, resource):
-        if resource == "duty":
-            message = _WSResourcer._duty_percent_to_duty_aero(message)
-        json_data = {resource: "0x{:X}".format(int(message))}
-        return json.dumps(json_data)
+    def _report(message, exception):
+        asyncio.get_event_loop().call_exception_handler({
+            "message": message,
+            "exception": exception,
+        })
+
+    async def __send_pending(self, ws):
+        if self._send_event is None:
+            self._send_event = asyncio.Event()
+        while True:
+            while not self._pending:
+                self._send_event.clear()
+                await self._send_event.wait()
+            resource = next(iter(self._pending))
+            message, posted_ts = self._pending.pop(resource)
+            if (
+                self._command_max_age is not None and
+                time.monotonic() - posted_ts > self._command_max_age
+            ):
+                self.dropped_commands += 1
+                continue
+            try:
+                await ws.send(message)
+            except (websockets.ConnectionClosed, asyncio.CancelledError):
+                # not sent, keep it for the next connection unless a newer
+                # value was posted meanwhile
+                self._pending.setdefault(resource, (message, posted_ts))
+                return
+            self.sent_commands += 1
+
+    def _record_read(self, resource, timestamp):
+        self._returned_ts[resource] = timestamp
+        age = time.monotonic() - timestamp
+        self._reads += 1
+        self._age_sum += age
+        self._age_max = max(self._age_max, age)
+
+    def _last_value(self, resource):
+        if not self._seq:
+            return None
+        index = (self._seq - 1) % self._history
+        self._record_read(resource, self._timestamps[index])
+        return self._safe_decode_frame(self._frames[index], resource)
+
+    def _samples_since(self, resource, seq):
+        # decode the messages received since the last read, the ones that
+        # can not be decoded are NaN
+        values = self._values[resource]
+        for pending in range(
+            max(self._decoded_seq[resource], self._seq - self._history),
+            self._seq
+        ):
+            index = pending % self._history
+            value = self._safe_decode_frame(self._frames[index], resource)
+            values[index] = math.nan if value is None else value
+        self._decoded_seq[resource] = self._seq
+
+        # nothing newer than the last message, e.g. a seq from before a
+        # restart
+        first = min(max(seq, self._seq - self._history, 0), self._seq)
+        samples = np.empty(self._seq - first, dtype=_SAMPLE_DTYPE)
+        samples["seq"] = np.arange(first, self._seq)
+        indexes = samples["seq"] % self._history
+        samples["timestamp"] = self._timestamps[indexes]
+        samples["value"] = self._values[resource][indexes]
+        return samples
+
+    def get_since(self, resource, seq=0):
+        """Gets every telemetry value of given resource received since a
+        sequence number, oldest first. Only the last samples are kept (4096
+        by default), so older ones are lost.
+
+        Each sample has the sequence number of its message (counting from
+        zero, since the telemetry started), the time it was received
+        (:func:`time.monotonic`), and the value. To read every sample only
+        once, ask for the samples since the last sequence number plus one:
+
+        .. code-block:: python
+
+            samples = angle.get_since(seq)
+            if len(samples):
+                seq = samples["seq"][-1] + 1
+
+        If the telemetry is not initialized it will be, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get`.
+
+        :param seq: The first sequence number to return.
+        :type seq: int
+
+        :return: The samples, with fields "seq", "timestamp" and "value".
+        :rtype: numpy.ndarray
+        """
+        if resource not in self._decoders:
+            raise ValueError("{} is not a valid uri.".format(resource))
+        if not self._connected:
+            self.__start_telemetry()
+        samples = self._samples_since(resource, seq)
+        if len(samples):
+            self._record_read(resource, samples["timestamp"][-1])
+        return samples
 
     def get(self, resource):
         """Gets the last telemetry value of given resource.
@@ -93,31 +463,296 @@ class _WSResourcer():
         :attr:`~nyquist._private.network.ws._WSResourcer.new_message` to
         False, and every time a new message is stored, that attribute will
         be set to true. This way the user can implement methods to avoid
-        reading the same message twice.
+        reading the same message twice. To wait for a new message without
+        polling, use
+        :meth:`~nyquist._private.network.ws._WSResourcer.wait_new`.
+
+        With the "all" get mode, instead of the last value, every value
+        received since the previous call is returned, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get_since`. So no
+        sample is lost even if the loop is slower than the telemetry.
         """
-        if resource not in self._get_uri_resource_map:
+        if resource not in self._decoders:
             raise ValueError("{} is not a valid uri.".format(resource))
         if not self._connected:
             self.__start_telemetry()
+        if self._get_mode == "all":
+            samples = self._samples_since(resource, self._read_seq[resource])
+            self._read_seq[resource] = self._seq
+            self.new_message = False
+            if len(samples):
+                self._record_read(resource, samples["timestamp"][-1])
+            return samples
         if self._get_mode == "new" and not self.new_message:
             return None
 
         self.new_message = False
-        decoded = self._decode(
-            self._last_ws_message,
-            self._get_uri_resource_map[resource]
+        return self._last_value(resource)
+
+    async def wait_new(self, resource, timeout=None):
+        """Waits until a new telemetry message arrives, and returns the value
+        of given resource. The waiter is woken up as soon as the message is
+        received, so there is no need to poll
+        :attr:`~nyquist._private.network.ws._WSResourcer.new_message`:
+
+        .. code-block:: python
+
+            angle = await aero.sensors.encoder.angle.wait_new(timeout=0.1)
+
+        If the telemetry is not initialized it will be, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get`. Unlike that
+        method, this one does not set
+        :attr:`~nyquist._private.network.ws._WSResourcer.new_message` to
+        False, so a later call to
+        :meth:`~nyquist._private.network.ws._WSResourcer.get` will still
+        return the new value.
+
+        :param timeout: The maximum time to wait [s], None waits forever.
+        :type timeout: float
+
+        :raises asyncio.TimeoutError: If no message arrived in time.
+        """
+        if resource not in self._decoders:
+            raise ValueError("{} is not a valid uri.".format(resource))
+        if not self._connected:
+            self.__start_telemetry()
+        if self._message_event is None:
+            self._message_event = asyncio.Event()
+
+        if timeout is None:
+            await self._message_event.wait()
+        else:
+            await asyncio.wait_for(self._message_event.wait(), timeout)
+        return self._last_value(resource)
+
+    def on_message(self, callback):
+        """Calls a function every time a telemetry message arrives, as
+        ``callback(seq, timestamp, values)``, where ``values`` has the value
+        of every streamed resource, in the order of the description (None
+        if the message does not have it). The callback can be a coroutine
+        function, in that case it's scheduled as a task.
+
+        If the telemetry is not initialized it will be, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get`.
+
+        :param callback: The function to call.
+        :type callback: callable
+        """
+        if not self._connected:
+            self.__start_telemetry()
+        self._message_callbacks.append(callback)
+
+    def remove_message_callback(self, callback):
+        """Stops calling a function added with
+        :meth:`~nyquist._private.network.ws._WSResourcer.on_message`.
+
+        :param callback: The function.
+        :type callback: callable
+        """
+        self._message_callbacks.remove(callback)
+
+    def age(self, resource):
+        """The age of the last value returned for given resource [s], that
+        is the time since it was received. Useful to compensate or reject
+        stale measurements:
+
+        .. code-block:: python
+
+            angle = aero.sensors.encoder.angle.get()
+            if aero.sensors.encoder.angle.age() > 2 * period_s:
+                ...
+
+        :return: The age, or NaN if no value was returned yet.
+        :rtype: float
+        """
+        if resource not in self._decoders:
+            raise ValueError("{} is not a valid uri.".format(resource))
+        return time.monotonic() - self._returned_ts[resource]
+
+    def telemetry_stats(self, period_s=None):
+        """Summarizes the telemetry received so far: the time between
+        messages compared with the telemetry period, the gaps, and the age
+        of the returned values.
+
+        :param period_s: The expected telemetry period [s], usually the
+                         ``/telemetry/period`` of the device. By default,
+                         the median time between messages.
+        :type period_s: float
+
+        :return: The summary, or None if no message was received.
+        :rtype: :class:`_TelemetryStats`
+        """
+        if not self._seq:
+            return None
+        samples = min(self._seq, self._history)
+        indexes = np.arange(self._seq - samples, self._seq) % self._history
+        intervals = np.diff(self._timestamps[indexes])
+        if len(intervals):
+            if period_s is None:
+                period_s = float(np.median(intervals))
+            gaps = intervals[intervals > 1.5 * period_s]
+            interval_stats = dict(
+                mean_interval_s=float(np.mean(intervals)),
+                max_interval_s=float(np.max(intervals)),
+                max_jitter_s=float(np.max(np.abs(intervals - period_s))),
+                gaps=len(gaps),
+                lost_messages=int(np.sum(np.round(gaps / period_s) - 1)),
+            )
+        else:
+            interval_stats = dict(
+                mean_interval_s=None,
+                max_interval_s=None,
+                max_jitter_s=None,
+                gaps=0,
+                lost_messages=0,
+            )
+
+        return _TelemetryStats(
+            messages=self._seq,
+            samples=samples,
+            period_s=period_s,
+            reads=self._reads,
+            mean_age_s=self._age_sum / self._reads if self._reads else None,
+            max_age_s=self._age_max if self._reads else None,
+            **interval_stats
+        )
+
+    def subscribe(self, resource, callback):
+        """Calls a function every time a new value of given resource
+        arrives, as ``callback(value, timestamp)``, where the timestamp is
+        the host receive time (:func:`time.monotonic`). The callback can be
+        a coroutine function, in that case it's scheduled as a task.
+
+        Callbacks run at the telemetry rate, independently of the control
+        loop, so they are a good place for fast safety checks or logging.
+        They run inside the telemetry reader, so they should be quick.
+
+        If the telemetry is not initialized it will be, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get`.
+
+        :param callback: The function to call.
+        :type callback: callable
+        """
+        if resource not in self._decoders:
+            raise ValueError("{} is not a valid uri.".format(resource))
+        if not self._connected:
+            self.__start_telemetry()
+        self._subscribers[resource].append(callback)
+        self.__update_subscribed()
+
+    def unsubscribe(self, resource, callback):
+        """Stops calling a function subscribed with
+        :meth:`~nyquist._private.network.ws._WSResourcer.subscribe`.
+
+        :param callback: The subscribed function.
+        :type callback: callable
+        """
+        if resource not in self._decoders:
+            raise ValueError("{} is not a valid uri.".format(resource))
+        self._subscribers[resource].remove(callback)
+        self.__update_subscribed()
+
+    def __update_subscribed(self):
+        self._subscribed = tuple(
+            (resource, callbacks)
+            for resource, callbacks in self._subscribers.items()
+            if callbacks
         )
-        return decoded
+
+    @property
+    def connected(self):
+        """Whether the websocket is currently open."""
+        return self._connected
+
+    async def wait_connected(self, timeout=None):
+        """Waits until the websocket is open, without polling. If the
+        telemetry is not initialized it will be, as in
+        :meth:`~nyquist._private.network.ws._WSResourcer.get`.
+
+        :param timeout: The maximum time to wait [s], None waits forever.
+        :type timeout: float
+
+        :raises asyncio.TimeoutError: If it did not connect in time.
+        """
+        if self._connected:
+            return
+        self.__start_telemetry()
+        if self._connected_event is None:
+            self._connected_event = asyncio.Event()
+        if timeout is None:
+            await self._connected_event.wait()
+        else:
+            await asyncio.wait_for(self._connected_event.wait(), timeout)
+
+    def on_connect(self, callback):
+        """Calls a function, without arguments, every time the websocket is
+        opened, including reconnections. The callback can be a coroutine
+        function, in that case it's scheduled as a task.
+
+        :param callback: The function to call.
+        :type callback: callable
+        """
+        self._connect_callbacks.append(callback)
+
+    def on_disconnect(self, callback):
+        """Calls a function, without arguments, every time the websocket is
+        closed or stops receiving telemetry. The callback can be a coroutine
+        function, in that case it's scheduled as a task.
+
+        Closed connections are retried, waiting longer after each failed
+        attempt (from ``reconnect_delay`` to ``max_reconnect_delay``), so an
+        unreachable device does not keep the CPU busy.
+
+        :param callback: The function to call.
+        :type callback: callable
+        """
+        self._disconnect_callbacks.append(callback)
+
+    async def close(self):
+        """Stops receiving telemetry and closes the websocket. The received
+        values can still be read, and a later read or command connects
+        again.
+        """
+        tasks = [
+            task for task in (self._telemetry_task, self._connection_task)
+            if task is not None
+        ]
+        self._telemetry_task = None
+        self._connection_task = None
+        # even if a cancellation is lost, the tasks stop at the next message
+        self._closing = True
+        try:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._closing = False
 
     def post(self, resource, value):
         """Sets the value of a resource through a fast channel,
         asynchronously.
+
+        Commands are not queued: if a value of the same resource is still
+        waiting to be sent (e.g. while reconnecting), it's replaced by the
+        new one, and counted in
+        :attr:`~nyquist._private.network.ws._WSResourcer.coalesced_commands`.
+        So after a reconnection only the newest value is sent, instead of a
+        burst of stale ones. If ``command_max_age`` was given, values that
+        waited longer than that are not sent at all, and counted in
+        :attr:`~nyquist._private.network.ws._WSResourcer.dropped_commands`.
         """
-        if resource not in self._post_uri_resource_map:
+        if resource not in self._encoders:
             raise ValueError("{} is not a valid uri.".format(resource))
         if not self._connected:
             self.__start_telemetry()
 
-        loop = asyncio.get_event_loop()
-        encoded = self._encode(value, self._post_uri_resource_map[resource])
-        loop.create_task(self.__async_send(encoded))
+        if resource in self._pending:
+            self.coalesced_commands += 1
+        key, encode = self._encoders[resource]
+        self._pending[resource] = (
+            json.dumps({key: encode(value)}),
+            time.monotonic()
+        )
+        if self._send_event is None:
+            self._send_event = asyncio.Event()
+        self._send_event.set()
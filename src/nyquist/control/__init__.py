@@ -1,4 +1,24 @@
+from .clocks import Clock, HybridClock, MonotonicClock, VirtualClock
 from .executor import Experiment
+from .fleet import Fleet, FleetResult
+from .logfile import LogReader, LogWriter
+from .recorder import Recorder
+from .runner import Runner
+from .timing import LoopTiming, LoopStats
 
 
-__all__ = ['Experiment', ]
+__all__ = [
+    'Clock',
+    'HybridClock',
+    'MonotonicClock',
+    'Experiment',
+    'Fleet',
+    'FleetResult',
+    'LogReader',
+    'LogWriter',
+    'Recorder',
+    'Runner',
+    'LoopTiming',
+    'LoopStats',
+    'VirtualClock',
+]
@@ -0,0 +1,254 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+
+
+class Clock:
+    """The source of time of an :class:`~nyquist.control.Experiment`. It
+    tells the time, and waits until a given time.
+
+    Every clock keeps track of the time it spent waiting and of the CPU
+    time used by the process since the last :meth:`Clock.reset`, so the
+    CPU cost of different clocks can be compared. An
+    :class:`~nyquist.control.Experiment` resets its clock when it starts
+    running.
+    """
+    def __init__(self):
+        self.reset()
+
+    def now(self):
+        """The current time [s], from an arbitrary reference.
+
+        :rtype: float
+        """
+        return time.monotonic()
+
+    async def sleep_until(self, deadline):
+        """Wait until the clock reaches the deadline.
+
+        :param deadline: A time as returned by :meth:`Clock.now`.
+        :type deadline: float
+        """
+        start = self.now()
+        await asyncio.sleep(max(deadline - start, 0))
+        self._sleep_time_s += self.now() - start
+
+    async def wait(self, future, deadline):
+        """Wait until a future is done, or until the clock reaches the
+        deadline, whichever comes first. The future is not cancelled.
+
+        :param future: The future (or task) to wait for.
+        :type future: asyncio.Future
+        :param deadline: A time as returned by :meth:`Clock.now`.
+        :type deadline: float
+
+        :return: Whether the future is done.
+        :rtype: bool
+        """
+        start = self.now()
+        await asyncio.wait((future, ), timeout=max(deadline - start, 0))
+        self._sleep_time_s += self.now() - start
+        return future.done()
+
+    async def sleep(self, duration_s):
+        """Wait for some time.
+
+        :param duration_s: The time to wait [s].
+        :type duration_s: float
+        """
+        await self.sleep_until(self.now() + duration_s)
+
+    def reset(self):
+        """Restart the time and CPU accounting."""
+        self._sleep_time_s = 0
+        self._spin_time_s = 0
+        self._reset_wall_ts = time.monotonic()
+        self._reset_cpu_ts = time.process_time()
+
+    @property
+    def sleep_time_s(self):
+        """Time spent sleeping, without using the CPU [s]."""
+        return self._sleep_time_s
+
+    @property
+    def spin_time_s(self):
+        """Time spent busy waiting [s]."""
+        return self._spin_time_s
+
+    @property
+    def cpu_usage(self):
+        """The CPU time used by the whole process over the elapsed time,
+        where 1 means a full core.
+
+        :rtype: float
+        """
+        wall_time_s = time.monotonic() - self._reset_wall_ts
+        if not wall_time_s:
+            return 0
+        return (time.process_time() - self._reset_cpu_ts) / wall_time_s
+
+
+class MonotonicClock(Clock):
+    """The default clock: sleeps with the event loop.
+
+    Cheap, but the wake up error of the event loop is usually around a
+    millisecond, which limits the loop frequency to a few hundred hertz.
+    """
+
+
+class HybridClock(Clock):
+    """A precise clock, for loops above a few hundred hertz.
+
+    It sleeps with the event loop until ``spin_threshold_s`` before the
+    deadline, and then busy waits on :func:`time.perf_counter` until the
+    deadline. While busy waiting it keeps yielding to the event loop, so
+    telemetry is still received, at the cost of using the CPU. The bigger
+    the threshold, the smaller the jitter and the bigger the CPU usage.
+
+    :param spin_threshold_s: How long before the deadline to start busy
+                             waiting [s].
+    :type spin_threshold_s: float
+    """
+    def __init__(self, spin_threshold_s=0.002):
+        super().__init__()
+        self._spin_threshold_s = spin_threshold_s
+
+    def now(self):
+        return time.perf_counter()
+
+    async def sleep_until(self, deadline):
+        start = time.perf_counter()
+        coarse = deadline - start - self._spin_threshold_s
+        if coarse > 0:
+            await asyncio.sleep(coarse)
+
+        spin_start = time.perf_counter()
+        self._sleep_time_s += spin_start - start
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0)
+        self._spin_time_s += time.perf_counter() - spin_start
+
+
+class VirtualClock(Clock):
+    """A simulated clock, for running experiments faster than real time,
+    e.g. against a simulated plant.
+
+    Sleeping does not wait: the clock jumps straight to the earliest
+    deadline any coroutine is waiting for, so the iterations run back to
+    back. A single clock can be shared by many experiments (e.g. run by a
+    :class:`~nyquist.control.Runner`), and they will wake up in the right
+    order.
+
+    The time only advances when every task using the clock is waiting on
+    it. A task uses the clock since it first sleeps on it (even for no
+    time, as an :class:`~nyquist.control.Experiment` does before its loop),
+    and from then on it counts as running between two sleeps, until it
+    finishes. So the code between two sleeps (e.g. an async hook that
+    awaits other things) takes no simulated time, however many times it
+    yields to the event loop. A task in :meth:`Clock.wait` is waiting on
+    the clock, not on the future.
+
+    Anything else awaited (network, :func:`asyncio.sleep`) takes real time
+    and does not move the simulated one.
+
+    :param start_s: The initial time [s].
+    :type start_s: float
+    """
+    def __init__(self, start_s=0):
+        self._now = start_s
+        self._waiters = []
+        self._order = itertools.count()
+        # the tasks using the clock, and the ones of them that are running
+        self._tasks = set()
+        self._running = set()
+        self._advancing = False
+        super().__init__()
+
+    def now(self):
+        return self._now
+
+    async def sleep_until(self, deadline):
+        task = self._join()
+        if deadline <= self._now:
+            # still let other coroutines run, as a real sleep would
+            await asyncio.sleep(0)
+            return
+
+        start = self._now
+        await self._wait(task, deadline)
+        self._sleep_time_s += self._now - start
+
+    def _join(self):
+        """Start counting the current task as a user of the clock."""
+        task = asyncio.current_task()
+        if task not in self._tasks:
+            self._tasks.add(task)
+            self._running.add(task)
+            task.add_done_callback(self._leave)
+        return task
+
+    async def wait(self, future, deadline):
+        # waiting for the future counts as waiting on the clock
+        task = self._join()
+        if not future.done() and deadline > self._now:
+            start = self._now
+            await self._wait(task, deadline, future)
+            self._sleep_time_s += self._now - start
+        return future.done()
+
+    async def _wait(self, task, deadline, future=None):
+        """Wait until the clock reaches the deadline, or the future is
+        done.
+        """
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        heapq.heappush(
+            self._waiters,
+            (deadline, next(self._order), waiter, task)
+        )
+        if future is not None:
+            future.add_done_callback(
+                functools.partial(self._wake, waiter, task)
+            )
+        self._running.discard(task)
+        self._schedule_advance(loop)
+        try:
+            await waiter
+        finally:
+            # woken up, or cancelled while sleeping
+            self._running.add(task)
+
+    def _leave(self, task):
+        self._tasks.discard(task)
+        self._running.discard(task)
+        self._schedule_advance(task.get_loop())
+
+    def _schedule_advance(self, loop):
+        if not self._running and not self._advancing and not loop.is_closed():
+            self._advancing = True
+            # let the tasks that were just started or woken up run first
+            loop.call_soon(self._advance)
+
+    def _advance(self):
+        self._advancing = False
+        if self._running:
+            # it will be scheduled again once they all wait
+            return
+
+        while self._waiters and self._waiters[0][2].done():
+            # woken up by a future, or cancelled while sleeping
+            heapq.heappop(self._waiters)
+        if not self._waiters:
+            return
+
+        self._now = max(self._now, self._waiters[0][0])
+        while self._waiters and self._waiters[0][0] <= self._now:
+            _, _, waiter, task = heapq.heappop(self._waiters)
+            self._wake(waiter, task)
+
+    def _wake(self, waiter, task, *_):
+        if not waiter.done():
+            waiter.set_result(None)
+            self._running.add(task)
@@ -1,6 +1,14 @@
 from abc import ABC, abstractmethod
 import asyncio
-import time
+import functools
+import math
+
+from nyquist.control.clocks import MonotonicClock
+from nyquist.control.timing import LoopTiming
+
+
+_SCHEDULER_MODES = ("relative", "absolute")
+_OVERRUN_POLICIES = ("skip", "catch-up", "shift")
 
 
 class Experiment(ABC):
@@ -10,6 +18,23 @@ class Experiment(ABC):
         self._run_time_s = 2 * 60
         self._before_loop_time_s = 0.5
         self._after_loop_time_s = 0
+        self._scheduler_mode = "relative"
+        self._overrun_policy = "skip"
+        self._timing = LoopTiming()
+        self._clock = MonotonicClock()
+        self._loop_trigger = None
+        self._loop_decimation = 1
+
+    def __getstate__(self):
+        # the event loop belongs to the process, so it is not pickled. This
+        # allows sending experiments to other processes
+        state = self.__dict__.copy()
+        del state["_loop"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._loop = asyncio.get_event_loop()
 
     def set_loop_frequency(self, frequency_hz):
         """
@@ -51,16 +76,239 @@ class Experiment(ABC):
 
         self._after_loop_time_s = time_s
 
+    def set_scheduler(self, mode, overrun_policy="skip"):
+        """
+        Define how the iterations of the control-loop are scheduled.
+
+        In ``"relative"`` mode (the default) the loop sleeps for one period
+        after each :meth:`Experiment.in_the_loop`, so the effective period is
+        the loop period plus the time spent in the user code.
+
+        In ``"absolute"`` mode the k-th iteration fires at the deadline
+        ``loop_start + k * period``, so the loop does not drift. When an
+        iteration ends after the next deadline (an overrun), the
+        ``overrun_policy`` decides what happens:
+
+        - ``"skip"``: the missed deadlines are dropped, and the loop waits
+          for the next deadline on the original grid.
+        - ``"catch-up"``: the missed iterations run back to back, without
+          sleeping, until the loop is back on the original grid.
+        - ``"shift"``: the next iteration runs immediately, and the grid is
+          shifted so that following deadlines are relative to it.
+
+        :param mode: The scheduler mode, ``"relative"`` or ``"absolute"``.
+        :type mode: str
+        :param overrun_policy: What to do on overruns, only used in
+                               ``"absolute"`` mode.
+        :type overrun_policy: str
+        """
+        if mode not in _SCHEDULER_MODES:
+            raise ValueError(
+                "The scheduler mode is not valid,"
+                " should be one of {}".format(_SCHEDULER_MODES)
+            )
+        if overrun_policy not in _OVERRUN_POLICIES:
+            raise ValueError(
+                "The overrun policy is not valid,"
+                " should be one of {}".format(_OVERRUN_POLICIES)
+            )
+        self._scheduler_mode = mode
+        self._overrun_policy = overrun_policy
+
+    def set_loop_trigger(self, trigger, decimation=1):
+        """
+        Run the control-loop on events instead of on a timer. Each iteration
+        will run as soon as ``trigger`` returns, for example, when new
+        telemetry arrives:
+
+        .. code-block:: python
+
+            def before_the_loop(self):
+                self.aero = System("aeropendulum")
+                self.set_loop_trigger(self.aero.sensors.encoder.angle.wait_new)
+
+        The loop frequency is then defined by the telemetry period, and
+        :meth:`Experiment.set_loop_frequency` is only used to detect
+        overruns. It can be called from :meth:`Experiment.before_the_loop`.
+
+        Each iteration is scheduled at the time of its event, so the
+        lateness of the loop statistics is the time from the event to the
+        iteration. The loop ends at the run time of the clock, even if no
+        event arrives.
+
+        :param trigger: A coroutine function that returns when the next
+                        iteration should run, or None to go back to the timer.
+        :type trigger: callable
+        :param decimation: Run one iteration every ``decimation`` events.
+        :type decimation: int
+        """
+        if decimation < 1:
+            raise ValueError("The decimation should be at least 1.")
+        self._loop_trigger = trigger
+        self._loop_decimation = decimation
+
+    def set_clock(self, clock):
+        """
+        Define the clock used to measure time and to wait between
+        iterations. By default a :class:`~nyquist.control.MonotonicClock`,
+        use a :class:`~nyquist.control.HybridClock` for precise loops above
+        a few hundred hertz, or a :class:`~nyquist.control.VirtualClock` to
+        run simulations faster than real time.
+
+        :param clock: The clock.
+        :type clock: :class:`~nyquist.control.clocks.Clock`
+        """
+        self._clock = clock
+
+    @property
+    def clock(self):
+        """The :class:`~nyquist.control.clocks.Clock` of the experiment, it
+        can be consulted for the time spent sleeping and the CPU usage of
+        the last run."""
+        return self._clock
+
+    def set_timing_capacity(self, iterations):
+        """
+        Define how many iterations are kept to compute the loop timing
+        statistics. Older iterations are overwritten.
+
+        :param iterations: The capacity of the timing ring buffer.
+        :type iterations: int
+        """
+        self._timing = LoopTiming(iterations)
+
+    @property
+    def loop_timing(self):
+        """The :class:`~nyquist.control.timing.LoopTiming` with the
+        scheduled time, wake-up time and user code duration of each iteration
+        of the last run."""
+        return self._timing
+
+    def get_loop_stats(self, percentiles=(50, 90, 99, 99.9), bins=20):
+        """
+        Summarize the timing of the control-loop of the last run. Useful to
+        find out which loop frequency can be sustained.
+
+        :param percentiles: The percentiles to compute.
+        :type percentiles: tuple
+        :param bins: The amount of bins of the lateness histogram.
+        :type bins: int
+
+        :return: The timing summary, or None if the loop did not run.
+        :rtype: :class:`~nyquist.control.timing.LoopStats`
+        """
+        return self._timing.stats(percentiles, bins)
+
+    def _running(self):
+        return self._clock.now() - self._start_ts < self._run_time_s
+
+    def _next_deadline(self, grid_start, k, now):
+        """Compute the next deadline of the absolute scheduler.
+
+        :param grid_start: The time of the iteration zero.
+        :param k: The index of the next iteration.
+        :param now: The current time.
+
+        :return: The (possibly updated) grid start, iteration index, and
+                 the deadline of the next iteration.
+        :rtype: tuple
+        """
+        period = self._loop_period_s
+        deadline = grid_start + k * period
+        if now <= deadline:
+            return grid_start, k, deadline
+
+        if self._overrun_policy == "skip":
+            k = math.ceil((now - grid_start) / period)
+            deadline = grid_start + k * period
+        elif self._overrun_policy == "shift":
+            grid_start = now - k * period
+            deadline = now
+        return grid_start, k, deadline
+
+    @staticmethod
+    def _as_coroutine_function(hook):
+        """Wrap the hook in a coroutine function, unless it already is one.
+        This way the hooks can be awaited, regardless of how the user defined
+        them.
+        """
+        if asyncio.iscoroutinefunction(hook):
+            return hook
+
+        @functools.wraps(hook)
+        async def wrapper():
+            return hook()
+        return wrapper
+
+    async def _relative_loop(self, in_the_loop):
+        scheduled = self._clock.now()
+        while self._running():
+            wake = self._clock.now()
+            await in_the_loop()
+            now = self._clock.now()
+            self._timing.record(scheduled, wake, now - wake)
+            scheduled = now + self._loop_period_s
+            await self._clock.sleep(self._loop_period_s)
+
+    async def _absolute_loop(self, in_the_loop):
+        grid_start = self._clock.now()
+        k = 0
+        deadline = grid_start
+        while self._running():
+            wake = self._clock.now()
+            await in_the_loop()
+            k += 1
+            now = self._clock.now()
+            self._timing.record(deadline, wake, now - wake)
+            grid_start, k, deadline = self._next_deadline(grid_start, k, now)
+            await self._clock.sleep_until(deadline)
+
+    async def _wait_trigger(self):
+        """Wait for the events of one iteration.
+
+        :return: The time of the last event.
+        :rtype: float
+        """
+        for _ in range(self._loop_decimation):
+            await self._loop_trigger()
+        return self._clock.now()
+
+    async def _triggered_loop(self, in_the_loop):
+        end = self._start_ts + self._run_time_s
+        while self._running():
+            trigger = asyncio.ensure_future(self._wait_trigger())
+            try:
+                triggered = await self._clock.wait(trigger, end)
+            finally:
+                if not trigger.done():
+                    trigger.cancel()
+            if not triggered:
+                break
+            # the iteration is scheduled when the event arrives, the
+            # lateness is how long it took to wake up the loop
+            event = trigger.result()
+            wake = self._clock.now()
+            await in_the_loop()
+            self._timing.record(event, wake, self._clock.now() - wake)
+
     async def control_algorithm(self):
+        # the sleep time and CPU usage of the clock are of this run only
+        self._clock.reset()
+        self._start_ts = self._clock.now()
+        in_the_loop = self._as_coroutine_function(self.in_the_loop)
         try:
-            self.before_the_loop()
-            await asyncio.sleep(self._before_loop_time_s)
-            while (time.monotonic() - self._start_ts < self._run_time_s):
-                self.in_the_loop()
-                await asyncio.sleep(self._loop_period_s)
-            await asyncio.sleep(self._after_loop_time_s)
+            await self._as_coroutine_function(self.before_the_loop)()
+            await self._clock.sleep(self._before_loop_time_s)
+            self._timing.reset(self._loop_period_s)
+            if self._loop_trigger is not None:
+                await self._triggered_loop(in_the_loop)
+            elif self._scheduler_mode == "absolute":
+                await self._absolute_loop(in_the_loop)
+            else:
+                await self._relative_loop(in_the_loop)
+            await self._clock.sleep(self._after_loop_time_s)
         finally:
-            self.after_the_loop()
+            await self._as_coroutine_function(self.after_the_loop)()
 
     @abstractmethod
     def before_the_loop(self):
@@ -68,6 +316,10 @@ class Experiment(ABC):
         called, this method will run first. Then it will wait for some time
         that can be set with :meth:`Experiment.set_before_loop_time` and after
         said delay, it will run the loop.
+
+        It can be defined as a coroutine (``async def``), in that case it
+        will be awaited. This allows waiting for network resources without
+        blocking the event loop that receives the telemetry.
         """
 
     @abstractmethod
@@ -76,6 +328,10 @@ class Experiment(ABC):
         called, this method will run in a loop, after
         :meth:`Experiment.before_the_loop`. This method will run in a loop
         with a frequency established by :meth:`Experiment.set_loop_frequency`.
+
+        It can be defined as a coroutine (``async def``), in that case it
+        will be awaited, and the time spent awaiting counts as time spent
+        in the loop.
         """
 
     @abstractmethod
@@ -83,6 +339,9 @@ class Experiment(ABC):
         """The user should define this method. When :meth:`Experiment.run` is
         called, this method will run after the loop, and after a delay that
         can be configured with :meth:`Experiment.set_after_loop_time`.
+
+        It can be defined as a coroutine (``async def``), in that case it
+        will be awaited.
         """
 
     def run(self, blocking=True):
@@ -97,8 +356,11 @@ class Experiment(ABC):
                 sleep(1 /_loop_period_s)
             sleep(_after_loop_time_s)
             after_the_loop()
+
+        The way the loop sleeps between iterations can be changed with
+        :meth:`Experiment.set_scheduler`, or replaced by events with
+        :meth:`Experiment.set_loop_trigger`.
         """
-        self._start_ts = time.monotonic()
         if blocking:
             self._loop.run_until_complete(self.control_algorithm())
         else:
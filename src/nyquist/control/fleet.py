@@ -0,0 +1,264 @@
+import asyncio
+from collections import namedtuple
+import multiprocessing
+import os
+import pickle
+import queue
+import traceback
+
+from nyquist.control.runner import Runner
+
+
+FleetResult = namedtuple(
+    "FleetResult",
+    [
+        "index",
+        "group",
+        "data",
+        "stats",
+        "exception",
+        "traceback",
+    ]
+)
+"""
+The outcome of one experiment run by a :class:`Fleet`.
+
+- ``index``: The order in which the experiment was added to the fleet.
+- ``group``: The group of the experiment.
+- ``data``: Whatever the ``collect`` function of the fleet returned.
+- ``stats``: The :class:`~nyquist.control.LoopStats` of the experiment.
+- ``exception``: None if it finished successfully, or the exception that
+  stopped it.
+- ``traceback``: The formatted traceback of the exception, if any.
+"""
+
+
+def collect_public_attributes(experiment):
+    """The default way to collect the data of an experiment run by a
+    :class:`Fleet`. Every public attribute that can be pickled, e.g. the
+    ``self.data`` list filled in the loop.
+
+    :param experiment: A finished experiment.
+    :type experiment: :class:`~nyquist.control.Experiment`
+
+    :return: The attributes, by name.
+    :rtype: dict
+    """
+    data = {}
+    for name, value in vars(experiment).items():
+        if name.startswith("_"):
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        data[name] = value
+    return data
+
+
+def _picklable_exception(exception):
+    try:
+        pickle.loads(pickle.dumps(exception))
+        return exception
+    except Exception:
+        return RuntimeError(repr(exception))
+
+
+def _run_worker(worker, jobs, results, collect, pin_cpu):
+    """The entry point of each worker process: runs all its experiments on
+    a new event loop, and streams back each result as soon as it's ready.
+    """
+    if pin_cpu and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[worker % len(cpus)]})
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    indexes = {}
+    for index, group, experiment in jobs:
+        experiment._loop = loop
+        indexes[id(experiment)] = (index, group)
+
+    def on_done(experiment, outcome):
+        index, group = indexes[id(experiment)]
+        try:
+            data = collect(experiment)
+        except Exception as e:
+            outcome = outcome or e
+            data = None
+        formatted_traceback = None
+        if outcome is not None:
+            formatted_traceback = "".join(
+                traceback.format_exception(
+                    type(outcome), outcome, outcome.__traceback__
+                )
+            )
+            outcome = _picklable_exception(outcome)
+        results.put(FleetResult(
+            index=index,
+            group=group,
+            data=data,
+            stats=experiment.get_loop_stats(),
+            exception=outcome,
+            traceback=formatted_traceback,
+        ))
+
+    try:
+        Runner([job[2] for job in jobs], on_done=on_done).run()
+    finally:
+        loop.close()
+
+
+class Fleet:
+    """Runs many experiments in a pool of worker processes, one event loop
+    per worker. Useful when the control code is CPU heavy, and a single
+    :class:`~nyquist.control.Runner` can not keep up.
+
+    The experiments are added to groups, usually one per device. Every
+    experiment of a group runs in the same worker, so a device is never
+    driven from two processes. Each worker runs its experiments
+    concurrently, with a :class:`~nyquist.control.Runner`.
+
+    The experiments are pickled and sent to the workers, so they should be
+    instances of a class defined at module level, and should create their
+    :class:`~nyquist.lab.System` in
+    :meth:`~nyquist.control.Experiment.before_the_loop`, as usual. Being
+    run in another process, the experiments of the parent process are not
+    modified, the data comes back in a :class:`FleetResult` instead.
+
+    :param workers: The amount of worker processes, by default the amount
+                    of CPUs.
+    :type workers: int
+    :param collect: Called in the worker with each finished experiment, it
+                    returns the data to send back. By default
+                    :func:`collect_public_attributes`. Must be picklable.
+    :type collect: callable
+    :param pin_cpu: Pin each worker to a single CPU, when supported.
+    :type pin_cpu: bool
+    """
+    def __init__(self, workers=None, collect=None, pin_cpu=False):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if collect is None:
+            collect = collect_public_attributes
+        self._workers = workers
+        self._collect = collect
+        self._pin_cpu = pin_cpu
+        self._jobs = []
+        self._groups = []
+
+    def add(self, experiment, group=None):
+        """Add an experiment to the fleet.
+
+        :param experiment: The experiment to add.
+        :type experiment: :class:`~nyquist.control.Experiment`
+        :param group: The group of the experiment, usually the device it
+                      drives. By default each experiment has its own group.
+        :type group: hashable
+
+        :return: The index of the experiment, see :class:`FleetResult`.
+        :rtype: int
+        """
+        index = len(self._jobs)
+        if group is None:
+            group = index
+        if group not in self._groups:
+            self._groups.append(group)
+        self._jobs.append((index, group, experiment))
+        return index
+
+    def _assign(self):
+        """Distribute the groups between the workers, round robin."""
+        workers = min(self._workers, len(self._groups))
+        assignments = [[] for _ in range(workers)]
+        for job in self._jobs:
+            worker = self._groups.index(job[1]) % len(assignments)
+            assignments[worker].append(job)
+        return assignments
+
+    def iter_results(self):
+        """Run every experiment, and yield each result as soon as it
+        arrives from the workers. If a worker dies, the experiments it was
+        running yield a result with a RuntimeError.
+
+        :return: The results, in completion order.
+        :rtype: iterator of :class:`FleetResult`
+        """
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        processes = []
+        pending = {}
+        for worker, jobs in enumerate(self._assign()):
+            process = context.Process(
+                target=_run_worker,
+                args=(worker, jobs, results, self._collect, self._pin_cpu),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+            for index, group, _ in jobs:
+                pending[index] = (group, process)
+
+        try:
+            while pending:
+                try:
+                    result = results.get(timeout=0.1)
+                except queue.Empty:
+                    yield from self._finished(results, pending)
+                    continue
+                if pending.pop(result.index, None) is not None:
+                    yield result
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+
+    @classmethod
+    def _finished(cls, results, pending):
+        """Yield the results left by the workers that exited, and a failure
+        for each experiment they did not report.
+
+        A worker sends everything before exiting, so whatever an exited
+        worker reported is already in the queue. It is drained first, and
+        only then are the experiments still pending considered lost.
+        """
+        exited = [
+            index
+            for index, (_, process) in pending.items()
+            if process.exitcode is not None
+        ]
+        while True:
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                break
+            if pending.pop(result.index, None) is not None:
+                yield result
+        yield from cls._reap(pending, exited)
+
+    @staticmethod
+    def _reap(pending, exited):
+        for index in exited:
+            if index in pending:
+                group, process = pending.pop(index)
+                yield FleetResult(
+                    index=index,
+                    group=group,
+                    data=None,
+                    stats=None,
+                    exception=RuntimeError(
+                        "The worker exited with code {}".format(
+                            process.exitcode
+                        )
+                    ),
+                    traceback=None,
+                )
+
+    def run(self):
+        """Run every experiment, and block until all of them have finished.
+
+        :return: The results, in the order the experiments were added.
+        :rtype: list of :class:`FleetResult`
+        """
+        return sorted(self.iter_results(), key=lambda result: result.index)
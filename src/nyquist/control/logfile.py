@@ -0,0 +1,228 @@
+import json
+import math
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+
+_MAGIC = b"NYQLOG01"
+_HEADER_LENGTH = struct.Struct("<I")
+_ALIGNMENT = 8
+
+
+class LogWriter:
+    """Streams the values of a control-loop to a binary file, one row per
+    iteration, so long runs are not kept in memory and are not lost on a
+    crash.
+
+    The rows are recorded into preallocated chunks of ``chunk_rows`` rows.
+    Full chunks are written and flushed by a background thread, so the
+    control-loop never waits for the disk. If the disk is too slow, more
+    chunks are allocated instead of blocking.
+
+    The file starts with a small header describing the columns, followed by
+    the rows, so it can be read back with :class:`LogReader`.
+
+    .. code-block:: python
+
+        with LogWriter("run.nyq", ("time", "angle")) as log:
+            log.record(time=..., angle=...)
+
+    :param path: The path of the file, it will be overwritten.
+    :type path: str
+    :param columns: The names of the columns.
+    :type columns: tuple of str
+    :param chunk_rows: The amount of rows written at once.
+    :type chunk_rows: int
+    :param dtype: The NumPy type of every column.
+    :type dtype: numpy.dtype
+    :param fsync: Whether to also sync each chunk to the disk, not only to
+                  the operating system.
+    :type fsync: bool
+    """
+    def __init__(
+        self, path, columns,
+        chunk_rows=4096,
+        dtype=float,
+        fsync=False,
+    ):
+        self._columns = tuple(columns)
+        # little endian, so the file can be read in any machine
+        column_dtype = np.dtype(dtype).newbyteorder("<")
+        self._dtype = np.dtype(
+            [(column, column_dtype) for column in self._columns]
+        )
+        self._chunk_rows = chunk_rows
+        self._fsync = fsync
+        self._file = open(path, "wb")
+        self._write_header()
+
+        self._free = queue.Queue()
+        self._full = queue.Queue()
+        self._chunk = self._new_chunk()
+        self._length = 0
+        self._rows = 0
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self.__write_chunks)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write_header(self):
+        header = json.dumps({
+            "columns": self._columns,
+            "dtype": self._dtype.descr,
+        }).encode()
+        used = len(_MAGIC) + _HEADER_LENGTH.size + len(header)
+        header += b" " * (-used % _ALIGNMENT)
+        self._file.write(_MAGIC)
+        self._file.write(_HEADER_LENGTH.pack(len(header)))
+        self._file.write(header)
+        self._file.flush()
+
+    def _new_chunk(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return np.zeros(self._chunk_rows, dtype=self._dtype)
+
+    def __write_chunks(self):
+        while True:
+            item = self._full.get()
+            if item is None:
+                return
+            chunk, length = item
+            try:
+                self._file.write(chunk[:length].view(np.uint8))
+                self._file.flush()
+                if self._fsync:
+                    os.fsync(self._file.fileno())
+            except Exception as e:
+                self._error = e
+            self._free.put(chunk)
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("The log is closed.")
+
+    @property
+    def columns(self):
+        """The names of the columns."""
+        return self._columns
+
+    def __len__(self):
+        """The amount of recorded rows, written or not."""
+        return self._rows
+
+    def record(self, **values):
+        """Record a row. Columns that are not given are recorded as NaN.
+
+        :param values: The value of each column, by name.
+        """
+        self._check()
+        row = tuple(values.pop(column, math.nan) for column in self._columns)
+        if values:
+            raise KeyError(
+                "{} are not columns of the log.".format(tuple(values))
+            )
+        self._chunk[self._length] = row
+        self._length += 1
+        self._rows += 1
+        if self._length == self._chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Send the recorded rows to the background thread to be written,
+        even if the current chunk is not full.
+        """
+        self._check()
+        if self._length:
+            self._full.put((self._chunk, self._length))
+            self._chunk = self._new_chunk()
+            self._length = 0
+
+    def close(self):
+        """Write every recorded row, and close the file."""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._full.put(None)
+            self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LogReader:
+    """Reads a file written by :class:`LogWriter`, by memory mapping it. The
+    file is not parsed nor loaded into memory, every column is a NumPy view
+    of the file.
+
+    If the file is still being written, or the writer crashed, only the
+    complete rows are read.
+
+    :param path: The path of the file.
+    :type path: str
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic = f.read(len(_MAGIC))
+            if magic != _MAGIC:
+                raise ValueError("{} is not a nyquist log.".format(path))
+            header_length, = _HEADER_LENGTH.unpack(
+                f.read(_HEADER_LENGTH.size)
+            )
+            header = json.loads(f.read(header_length).decode())
+
+        self._columns = tuple(header["columns"])
+        dtype = np.dtype([tuple(field) for field in header["dtype"]])
+        offset = len(_MAGIC) + _HEADER_LENGTH.size + header_length
+        rows = (os.path.getsize(path) - offset) // dtype.itemsize
+        if rows:
+            self._data = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=offset,
+                shape=(rows, ),
+            )
+        else:
+            self._data = np.zeros(0, dtype=dtype)
+
+    @property
+    def columns(self):
+        """The names of the columns."""
+        return self._columns
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, column):
+        """The values of a column, as a read-only view of the file.
+
+        :param column: The name of the column.
+        :type column: str
+        """
+        return self._data[column]
+
+    def to_numpy(self):
+        """Every row, as a read-only view of the file. Each column can be
+        accessed by name.
+
+        :rtype: numpy.ndarray
+        """
+        return self._data
@@ -0,0 +1,122 @@
+import math
+
+import numpy as np
+
+
+class Recorder:
+    """Records the values of a control-loop, one row per iteration.
+
+    The rows are stored in a preallocated NumPy structured array, with one
+    field per column. Recording a row is a single assignment, and the
+    storage only grows (by ``chunk`` rows) when it's full, so long runs do
+    not allocate on every iteration.
+
+    .. code-block:: python
+
+        def before_the_loop(self):
+            self.data = Recorder.for_experiment(self, ("time", "angle"))
+
+        def in_the_loop(self):
+            self.data.record(time=..., angle=...)
+
+    :param columns: The names of the columns.
+    :type columns: tuple of str
+    :param capacity: The initial amount of rows.
+    :type capacity: int
+    :param chunk: The amount of rows to add when the storage is full, by
+                  default the initial capacity.
+    :type chunk: int
+    :param dtype: The NumPy type of every column.
+    :type dtype: numpy.dtype
+    """
+    def __init__(self, columns, capacity=1024, chunk=None, dtype=float):
+        self._columns = tuple(columns)
+        self._dtype = np.dtype([(column, dtype) for column in self._columns])
+        self._chunk = chunk or max(capacity, 1)
+        self._data = np.zeros(max(capacity, 1), dtype=self._dtype)
+        self._length = 0
+
+    @classmethod
+    def for_experiment(cls, experiment, columns, dtype=float):
+        """Create a recorder big enough to record every iteration of an
+        experiment, given its current run time and loop frequency.
+
+        :param experiment: The experiment that will be recorded.
+        :type experiment: :class:`~nyquist.control.Experiment`
+        :param columns: The names of the columns.
+        :type columns: tuple of str
+        :param dtype: The NumPy type of every column.
+        :type dtype: numpy.dtype
+
+        :return: A new recorder.
+        :rtype: :class:`Recorder`
+        """
+        capacity = math.ceil(
+            experiment._run_time_s / experiment._loop_period_s
+        ) + 1
+        return cls(columns, capacity=capacity, dtype=dtype)
+
+    @property
+    def columns(self):
+        """The names of the columns."""
+        return self._columns
+
+    def record(self, **values):
+        """Record a row. Columns that are not given are recorded as NaN.
+
+        :param values: The value of each column, by name.
+        """
+        if self._length == len(self._data):
+            self._grow()
+        row = tuple(values.pop(column, math.nan) for column in self._columns)
+        if values:
+            raise KeyError(
+                "{} are not columns of the recorder.".format(tuple(values))
+            )
+        self._data[self._length] = row
+        self._length += 1
+
+    def _grow(self):
+        grown = np.zeros(len(self._data) + self._chunk, dtype=self._dtype)
+        grown[:self._length] = self._data[:self._length]
+        self._data = grown
+
+    def clear(self):
+        """Forget every recorded row, keeping the storage."""
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, column):
+        """The recorded values of a column, as a NumPy view.
+
+        :param column: The name of the column.
+        :type column: str
+        """
+        return self._data[column][:self._length]
+
+    def to_numpy(self):
+        """The recorded rows, as a view of the storage (no copy is made).
+        Each column can be accessed by name.
+
+        :return: The recorded rows.
+        :rtype: numpy.ndarray
+        """
+        return self._data[:self._length]
+
+    def to_csv(self, path, header=True):
+        """Write the recorded rows to a CSV file, all at once.
+
+        :param path: The path of the file.
+        :type path: str
+        :param header: Whether to write the names of the columns first.
+        :type header: bool
+        """
+        np.savetxt(
+            path,
+            np.column_stack([self[column] for column in self._columns]),
+            delimiter=",",
+            header=",".join(self._columns) if header else "",
+            comments="",
+        )
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+
+from nyquist.control.timing import LoopTiming
+
+
+class Runner:
+    """Runs many experiments concurrently, on a single event loop.
+
+    Each :class:`~nyquist.control.Experiment` keeps its own configuration
+    (loop frequency, scheduler, run time, etc.) and usually its own
+    :class:`~nyquist.lab.System`, but all of them share the event loop, so
+    a single process can drive many laboratory systems.
+
+    :param experiments: The experiments to run.
+    :type experiments: iterable of :class:`~nyquist.control.Experiment`
+    :param on_done: Called as ``on_done(experiment, outcome)`` each time an
+                    experiment finishes, the outcome is as in
+                    :attr:`Runner.results`.
+    :type on_done: callable
+    """
+    def __init__(self, experiments=(), on_done=None):
+        self._loop = asyncio.get_event_loop()
+        self._experiments = list(experiments)
+        self._on_done = on_done
+        self._tasks = []
+        self._results = []
+
+    def add(self, experiment):
+        """Add an experiment to the runner. It will be run on the next
+        :meth:`Runner.run`.
+
+        :param experiment: The experiment to add.
+        :type experiment: :class:`~nyquist.control.Experiment`
+        """
+        self._experiments.append(experiment)
+
+    @property
+    def experiments(self):
+        """The experiments of the runner, in the order they were added."""
+        return tuple(self._experiments)
+
+    @property
+    def results(self):
+        """The outcome of each experiment of the last run, in the order they
+        were added: None if it finished successfully, or the exception that
+        stopped it."""
+        return tuple(self._results)
+
+    @staticmethod
+    def _outcome(task):
+        if task.cancelled():
+            return asyncio.CancelledError()
+        return task.exception()
+
+    def _notify_done(self, experiment, task):
+        self._on_done(experiment, self._outcome(task))
+
+    def stop(self):
+        """Stop every running experiment. The experiments are cancelled,
+        but their :meth:`~nyquist.control.Experiment.after_the_loop` will
+        still run.
+        """
+        for task in self._tasks:
+            task.cancel()
+
+    async def run_async(self):
+        """Coroutine version of :meth:`Runner.run`, to be awaited from an
+        already running event loop.
+
+        :return: The outcome of each experiment, see :attr:`Runner.results`.
+        :rtype: tuple
+        """
+        self._tasks = [
+            self._loop.create_task(experiment.control_algorithm())
+            for experiment in self._experiments
+        ]
+        if self._on_done is not None:
+            for experiment, task in zip(self._experiments, self._tasks):
+                task.add_done_callback(
+                    functools.partial(self._notify_done, experiment)
+                )
+        try:
+            outcomes = await asyncio.gather(
+                *self._tasks,
+                return_exceptions=True
+            )
+        finally:
+            # if the runner itself was cancelled, let every experiment run
+            # its after_the_loop
+            self.stop()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        self._results = [
+            outcome if isinstance(outcome, BaseException) else None
+            for outcome in outcomes
+        ]
+        return self.results
+
+    def run(self):
+        """Run every experiment concurrently, and block until all of them
+        have finished. An exception in one experiment does not stop the
+        others, it is stored in :attr:`Runner.results`. Interrupting the
+        runner (e.g. with Ctrl+C) stops all of them.
+
+        :return: The outcome of each experiment, see :attr:`Runner.results`.
+        :rtype: tuple
+        """
+        task = self._loop.create_task(self.run_async())
+        try:
+            return self._loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            task.cancel()
+            self._loop.run_until_complete(
+                asyncio.gather(task, return_exceptions=True)
+            )
+            raise
+
+    def get_loop_stats(self, percentiles=(50, 90, 99, 99.9), bins=20):
+        """Summarize the timing of the control-loops of every experiment
+        together. The ``mean_period_s`` of the summary is the mean time
+        between any two iterations, of any experiment.
+
+        Use :meth:`~nyquist.control.Experiment.get_loop_stats` for the
+        statistics of a single experiment.
+
+        :param percentiles: The percentiles to compute.
+        :type percentiles: tuple
+        :param bins: The amount of bins of the lateness histogram.
+        :type bins: int
+
+        :return: The timing summary, or None if no loop did run.
+        :rtype: :class:`~nyquist.control.timing.LoopStats`
+        """
+        merged = LoopTiming.merged(
+            experiment.loop_timing for experiment in self._experiments
+        )
+        return merged.stats(percentiles, bins)
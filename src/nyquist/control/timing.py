@@ -0,0 +1,204 @@
+from array import array
+from collections import namedtuple
+
+
+LoopStats = namedtuple(
+    "LoopStats",
+    [
+        "iterations",
+        "samples",
+        "period_s",
+        "mean_period_s",
+        "lateness_percentiles_s",
+        "duration_percentiles_s",
+        "max_jitter_s",
+        "overruns",
+        "histogram",
+    ]
+)
+"""
+A summary of the timing of a control-loop. Every time is in seconds.
+
+- ``iterations``: Iterations recorded since the last reset.
+- ``samples``: Iterations still available in the ring buffer, the
+  statistics are computed over these ones.
+- ``period_s``: The configured loop period.
+- ``mean_period_s``: The mean time between two consecutive wake-ups.
+- ``lateness_percentiles_s``: Dict ``{percentile: lateness}``, where the
+  lateness is the actual wake time minus the scheduled one.
+- ``duration_percentiles_s``: Dict ``{percentile: duration}`` of the user
+  code.
+- ``max_jitter_s``: The maximum absolute lateness.
+- ``overruns``: Iterations that ended after the next scheduled wake-up.
+- ``histogram``: Tuple ``(edges, counts)`` of the lateness.
+"""
+
+
+def _percentile(sorted_values, percentile):
+    """Linear interpolation percentile of an already sorted sequence."""
+    position = (len(sorted_values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return (
+        sorted_values[lower] * (1 - fraction) +
+        sorted_values[upper] * fraction
+    )
+
+
+def _histogram(values, bins):
+    low = min(values)
+    high = max(values)
+    width = (high - low) / bins or 1
+    edges = [low + i * width for i in range(bins + 1)]
+    counts = [0] * bins
+    for value in values:
+        counts[min(int((value - low) / width), bins - 1)] += 1
+    return edges, counts
+
+
+class LoopTiming:
+    """Records the timing of each iteration of a control-loop.
+
+    The timings are stored in a preallocated ring buffer, so recording an
+    iteration never allocates memory. When the buffer is full, the oldest
+    iterations are overwritten.
+
+    :param capacity: The amount of iterations to keep.
+    :type capacity: int
+    """
+    def __init__(self, capacity=4096):
+        self._capacity = capacity
+        self._scheduled = array("d", bytes(8 * capacity))
+        self._wake = array("d", bytes(8 * capacity))
+        self._duration = array("d", bytes(8 * capacity))
+        self.reset()
+
+    def reset(self, period_s=None):
+        """Forget every recorded iteration.
+
+        :param period_s: The loop period that will be used to detect
+                         overruns.
+        :type period_s: float
+        """
+        self._period_s = period_s
+        self._index = 0
+        self._iterations = 0
+        self._overruns = 0
+
+    @classmethod
+    def merged(cls, timings):
+        """Merge the iterations of many loops, ordered by wake-up time.
+        Useful to summarize many control-loops running together.
+
+        :param timings: The timings to merge.
+        :type timings: iterable of :class:`LoopTiming`
+
+        :return: A new timing, with all the stored iterations.
+        :rtype: :class:`LoopTiming`
+        """
+        timings = list(timings)
+        samples = sorted(
+            sample
+            for timing in timings
+            for sample in zip(timing.wake, timing.scheduled, timing.duration)
+        )
+        periods = set(timing._period_s for timing in timings)
+
+        merged = cls(max(len(samples), 1))
+        merged.reset(periods.pop() if len(periods) == 1 else None)
+        for wake, scheduled, duration in samples:
+            merged.record(scheduled, wake, duration)
+        merged._iterations = sum(timing._iterations for timing in timings)
+        merged._overruns = sum(timing._overruns for timing in timings)
+        return merged
+
+    def record(self, scheduled, wake, duration):
+        """Store the timing of one iteration.
+
+        :param scheduled: The time at which the iteration should have run.
+        :type scheduled: float
+        :param wake: The time at which the iteration actually run.
+        :type wake: float
+        :param duration: The time spent in the user code.
+        :type duration: float
+        """
+        i = self._index
+        self._scheduled[i] = scheduled
+        self._wake[i] = wake
+        self._duration[i] = duration
+        self._index = (i + 1) % self._capacity
+        self._iterations += 1
+        if (
+            self._period_s is not None and
+            wake + duration > scheduled + self._period_s
+        ):
+            self._overruns += 1
+
+    def __len__(self):
+        return min(self._iterations, self._capacity)
+
+    def _ordered(self, buffer):
+        if self._iterations <= self._capacity:
+            return buffer[:self._iterations].tolist()
+        return (buffer[self._index:] + buffer[:self._index]).tolist()
+
+    @property
+    def scheduled(self):
+        """The scheduled times of the stored iterations, oldest first."""
+        return self._ordered(self._scheduled)
+
+    @property
+    def wake(self):
+        """The wake-up times of the stored iterations, oldest first."""
+        return self._ordered(self._wake)
+
+    @property
+    def duration(self):
+        """The user code durations of the stored iterations, oldest first."""
+        return self._ordered(self._duration)
+
+    @property
+    def lateness(self):
+        """The wake-up time minus the scheduled time of the stored
+        iterations, oldest first."""
+        return [w - s for w, s in zip(self.wake, self.scheduled)]
+
+    def stats(self, percentiles=(50, 90, 99, 99.9), bins=20):
+        """Summarize the stored iterations.
+
+        :param percentiles: The percentiles to compute.
+        :type percentiles: tuple
+        :param bins: The amount of bins of the lateness histogram.
+        :type bins: int
+
+        :return: The timing summary, or None if nothing was recorded.
+        :rtype: :class:`LoopStats`
+        """
+        if not len(self):
+            return None
+
+        wake = self.wake
+        lateness = self.lateness
+        sorted_lateness = sorted(lateness)
+        sorted_duration = sorted(self.duration)
+        if len(wake) > 1:
+            mean_period_s = (wake[-1] - wake[0]) / (len(wake) - 1)
+        else:
+            mean_period_s = None
+
+        return LoopStats(
+            iterations=self._iterations,
+            samples=len(self),
+            period_s=self._period_s,
+            mean_period_s=mean_period_s,
+            lateness_percentiles_s={
+                p: _percentile(sorted_lateness, p) for p in percentiles
+            },
+            duration_percentiles_s={
+                p: _percentile(sorted_duration, p) for p in percentiles
+            },
+            max_jitter_s=max(abs(sorted_lateness[0]), sorted_lateness[-1]),
+            overruns=self._overruns,
+            histogram=_histogram(lateness, bins),
+        )
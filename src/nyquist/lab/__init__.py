@@ -1,4 +1,5 @@
+from .bus import TelemetryPublisher, TelemetryReader
 from .client import System
 
 
-__all__ = ['System', ]
+__all__ = ['System', 'TelemetryPublisher', 'TelemetryReader', ]
@@ -0,0 +1,297 @@
+import json
+import math
+import os
+import struct
+from multiprocessing import shared_memory
+
+if os.name == "posix":
+    from multiprocessing import resource_tracker
+
+import numpy as np
+
+from nyquist._private.network.base import _Resource, _generate_tree
+from nyquist._private.network.ws import _SAMPLE_DTYPE
+
+
+_MAGIC = b"NYQBUS01"
+_HEADER = struct.Struct("<8sqI")
+_ALIGNMENT = 8
+
+
+def _layout(header_length, history, resources):
+    """The offsets of the sequence number, the timestamps and the values in
+    the shared memory.
+    """
+    used = _HEADER.size + header_length
+    timestamps_offset = used + (-used % _ALIGNMENT)
+    values_offset = timestamps_offset + history * 8
+    size = values_offset + resources * history * 8
+    return timestamps_offset, values_offset, size
+
+
+class TelemetryPublisher:
+    """Shares the telemetry of a :class:`~nyquist.lab.System` with other
+    local processes, through a shared memory ring buffer. So a controller,
+    a live plot and a logger can read the same device, with a single
+    websocket connection, and decoding each message only once.
+
+    The process that owns the system publishes, and the others read with
+    :class:`TelemetryReader`:
+
+    .. code-block:: python
+
+        aero = System("aeropendulum")
+        with TelemetryPublisher(aero, "aero"):
+            experiment.run()
+
+    Every message is decoded and written as soon as it arrives, so the
+    event loop of the publisher must be running (e.g. while an experiment
+    runs).
+
+    The ring buffer has a single writer and is lock-free: readers never
+    block the publisher, they detect and discard the samples that were
+    overwritten while reading.
+
+    :param system: The system whose telemetry will be published.
+    :type system: :class:`~nyquist.lab.System`
+    :param name: The name of the shared memory, the readers attach to it.
+                 By default a random one, see :attr:`TelemetryPublisher.name`.
+    :type name: str
+    :param history: The amount of samples kept in the ring buffer, the
+                    readers get the last ``history - 1`` ones.
+    :type history: int
+    """
+    def __init__(self, system, name=None, history=4096):
+        self._resourcer = system._ws_resourcer
+        resources = self._resourcer._streamed
+        header = json.dumps({
+            "history": history,
+            "resources": [
+                (resource.uri, resource.docs) for resource in resources
+            ],
+        }).encode()
+        timestamps_offset, values_offset, size = _layout(
+            len(header), history, len(resources)
+        )
+        self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _HEADER.pack_into(self._shm.buf, 0, _MAGIC, 0, len(header))
+        self._shm.buf[_HEADER.size:_HEADER.size + len(header)] = header
+
+        self._history = history
+        self._seq = np.ndarray(
+            1, dtype=np.int64, buffer=self._shm.buf, offset=len(_MAGIC)
+        )
+        self._timestamps = np.ndarray(
+            history,
+            dtype=np.float64,
+            buffer=self._shm.buf,
+            offset=timestamps_offset,
+        )
+        self._values = np.ndarray(
+            (len(resources), history),
+            dtype=np.float64,
+            buffer=self._shm.buf,
+            offset=values_offset,
+        )
+        self._closed = False
+        self._resourcer.on_message(self._publish)
+
+    @property
+    def name(self):
+        """The name of the shared memory."""
+        return self._shm.name
+
+    def _publish(self, seq, timestamp, values):
+        published = int(self._seq[0])
+        index = published % self._history
+        self._timestamps[index] = timestamp
+        self._values[:, index] = [
+            math.nan if value is None else value for value in values
+        ]
+        # the sample is visible to the readers only after it's complete
+        self._seq[0] = published + 1
+
+    def close(self):
+        """Stop publishing, and release the shared memory. Readers already
+        attached can still read the published samples.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._resourcer.remove_message_callback(self._publish)
+        del self._seq, self._timestamps, self._values
+        self._shm.close()
+        if os.name == "posix":
+            # a reader in this same process unregistered the memory, see
+            # TelemetryReader
+            resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TelemetryReader:
+    """Reads the telemetry shared by a :class:`TelemetryPublisher`, from
+    any local process.
+
+    Like a :class:`~nyquist.lab.System`, it has one attribute per word of
+    the uri of each streamed resource, with ``get`` and ``get_since``
+    methods:
+
+    .. code-block:: python
+
+        with TelemetryReader("aero") as aero:
+            angle = aero.sensors.encoder.angle.get()
+
+    The samples are not copied nor decoded again, :meth:`values` and
+    :attr:`timestamps` are NumPy views of the shared memory.
+
+    :param name: The name of the shared memory of the publisher.
+    :type name: str
+    """
+    def __init__(self, name):
+        self._shm = shared_memory.SharedMemory(name)
+        if os.name == "posix":
+            # attaching registers the memory, as if this process created
+            # it, and it would be unlinked when this process exits
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        magic, _, header_length = _HEADER.unpack_from(self._shm.buf, 0)
+        if magic != _MAGIC:
+            self._shm.close()
+            raise ValueError("{} is not a telemetry bus.".format(name))
+        header = json.loads(bytes(
+            self._shm.buf[_HEADER.size:_HEADER.size + header_length]
+        ).decode())
+
+        self._history = history = header["history"]
+        self._uris = [uri for uri, _ in header["resources"]]
+        timestamps_offset, values_offset, _ = _layout(
+            header_length, history, len(self._uris)
+        )
+        self._seq = np.ndarray(
+            1, dtype=np.int64, buffer=self._shm.buf, offset=len(_MAGIC)
+        )
+        self._timestamps = np.ndarray(
+            history,
+            dtype=np.float64,
+            buffer=self._shm.buf,
+            offset=timestamps_offset,
+        )
+        self._values = np.ndarray(
+            (len(self._uris), history),
+            dtype=np.float64,
+            buffer=self._shm.buf,
+            offset=values_offset,
+        )
+        self._timestamps.flags.writeable = False
+        self._values.flags.writeable = False
+        self._closed = False
+
+        for uri, docs in header["resources"]:
+            iterable_path = list(filter(None, uri.split("/")))
+            _generate_tree(
+                self,
+                self,
+                iterable_path,
+                _Resource(uri=uri, methods=["GET"], docs=docs),
+            )
+
+    @property
+    def uris(self):
+        """The uris of the published resources."""
+        return tuple(self._uris)
+
+    @property
+    def seq(self):
+        """The amount of samples published so far."""
+        return int(self._seq[0])
+
+    @property
+    def timestamps(self):
+        """The receive time of the samples (:func:`time.monotonic`), as a
+        read-only view of the ring buffer, the sample ``seq`` is at
+        ``seq % len(timestamps)``.
+        """
+        return self._timestamps
+
+    def values(self, resource):
+        """The values of a resource, as a read-only view of the ring buffer,
+        laid out as :attr:`TelemetryReader.timestamps`.
+
+        :param resource: The uri of the resource.
+        :type resource: str
+
+        :rtype: numpy.ndarray
+        """
+        return self._values[self.__index(resource)]
+
+    def __index(self, resource):
+        try:
+            return self._uris.index(resource)
+        except ValueError:
+            raise ValueError("{} is not a valid uri.".format(resource))
+
+    def get(self, resource):
+        """Gets the last published value of a resource.
+
+        :param resource: The uri of the resource.
+        :type resource: str
+
+        :return: The value, or None if nothing was published yet.
+        :rtype: float
+        """
+        index = self.__index(resource)
+        seq = int(self._seq[0])
+        if not seq:
+            return None
+        return float(self._values[index, (seq - 1) % self._history])
+
+    def get_since(self, resource, seq=0):
+        """Gets every published value of a resource since a sequence
+        number, oldest first, as
+        :meth:`~nyquist._private.network.ws._WSResourcer.get_since`. The
+        sequence numbers count the published samples.
+
+        :param resource: The uri of the resource.
+        :type resource: str
+        :param seq: The first sequence number to return.
+        :type seq: int
+
+        :return: The samples, with fields "seq", "timestamp" and "value".
+        :rtype: numpy.ndarray
+        """
+        index = self.__index(resource)
+        end = int(self._seq[0])
+        # nothing newer than the last sample, e.g. a seq from before a
+        # restart
+        first = min(max(seq, end - self._history, 0), end)
+        samples = np.empty(end - first, dtype=_SAMPLE_DTYPE)
+        samples["seq"] = np.arange(first, end)
+        indexes = samples["seq"] % self._history
+        samples["timestamp"] = self._timestamps[indexes]
+        samples["value"] = self._values[index, indexes]
+
+        # the publisher may have overwritten the oldest ones meanwhile, and
+        # the slot of the next sample may be half written
+        overwritten = int(self._seq[0]) + 1 - self._history - first
+        if overwritten > 0:
+            samples = samples[overwritten:]
+        return samples
+
+    def close(self):
+        """Detach from the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        del self._seq, self._timestamps, self._values
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
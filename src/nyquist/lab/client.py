@@ -1,7 +1,8 @@
-from nyquist._private.network.base import (
-    _Void,
-    _Endpoint,
-)
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from nyquist._private.network.base import _generate_tree
 from nyquist._private.network.http import _HTTPResourcer
 from nyquist._private.network.ws import _WSResourcer
 from nyquist.lab.descriptions import (
@@ -10,6 +11,20 @@ from nyquist.lab.descriptions import (
 )
 
 
+_INITIALIZATION_RESOURCES = ("status", )
+"""The last words of the uris of the resources that other settings depend
+on, e.g. a PWM has to be initialized before setting its duty. See
+:meth:`System.configure`.
+"""
+
+
+_BatchResult = namedtuple("BatchResult", ["results", "errors"])
+"""The outcome of requests to many resources at once, see
+:meth:`System.configure` and :meth:`System.snapshot`: what each request
+returned, and the exception raised by each one that failed, both by uri.
+"""
+
+
 class System:
     """Generates an object with the complete resource tree as attributes.
 
@@ -35,7 +50,8 @@ class System:
     :type ip: str
     :param http_resources: Set of HTTP resources.
     :type http_resources: tuple
-    :param ws_resources: Set of Websocket resources.
+    :param ws_resources: Set of Websocket resources, each with the codec of
+                         its messages.
     :type ws_resources: tuple
     :param http_port: Destination HTTP port.
     :type http_port: int
@@ -46,24 +62,18 @@ class System:
     :param ws_timeout: Timeout for each ws request.
     :type ws_timeout: float
     :param ws_get_mode: Strategy to gather messages.
-    :type ws_timeout: str. ("new" or "last").
-    """
-    @staticmethod
-    def __generate_tree(obj, resourcer, iterable_path, resource):
-        for subresource in iterable_path:
-            if not hasattr(obj, subresource):
-                if len(iterable_path) == 1:
-                    setattr(obj, subresource, _Endpoint(resourcer, resource))
-                else:
-                    setattr(obj, subresource, _Void())
-            iterable_path.pop(0)
-            System.__generate_tree(
-                getattr(obj, subresource),
-                resourcer,
-                iterable_path,
-                resource
-            )
+    :type ws_timeout: str. ("new", "last" or "all").
+    :param ws_history: Amount of telemetry samples kept by each websocket
+                       resource.
+    :type ws_history: int
+    :param ws_command_max_age: Time after which a websocket command that
+                               could not be sent (e.g. while reconnecting)
+                               is dropped, None sends it no matter how old.
+    :type ws_command_max_age: float
 
+    Many HTTP resources can be set or read at once, with concurrent
+    requests, with :meth:`System.configure` and :meth:`System.snapshot`.
+    """
     def __init__(
         self, description,
         ip=None,
@@ -74,9 +84,12 @@ class System:
         http_timeout=None,
         ws_timeout=None,
         ws_get_mode=None,
+        ws_history=None,
+        ws_command_max_age=None,
     ):
         valid_devices = (
             "aeropendulum",
+            "motor-encoder",
         )
         if description not in valid_devices:
             raise ValueError(
@@ -104,13 +117,29 @@ class System:
             ws_timeout = device_map[description].ws_timeout
         if ws_get_mode is None:
             ws_get_mode = device_map[description].ws_get_mode
+        if ws_history is None:
+            ws_history = device_map[description].ws_history
 
         http_resourcer = _HTTPResourcer(ip, http_port, http_timeout)
-        ws_resourcer = _WSResourcer(ip, ws_port, ws_timeout, ws_get_mode)
+        ws_resourcer = _WSResourcer(
+            ip,
+            ws_port,
+            ws_timeout,
+            ws_get_mode,
+            ws_history,
+            ws_command_max_age,
+            resources=ws_resources,
+        )
+        self._http_resourcer = http_resourcer
+        self._ws_resourcer = ws_resourcer
+        self._http_resources = {
+            http_resource.uri: http_resource
+            for http_resource in http_resources
+        }
 
         for http_resource in http_resources:
             iterable_path = list(filter(None, http_resource.uri.split("/")))
-            self.__generate_tree(
+            _generate_tree(
                 self,
                 http_resourcer,
                 iterable_path,
@@ -119,9 +148,172 @@ class System:
 
         for ws_resource in ws_resources:
             iterable_path = list(filter(None, ws_resource.uri.split("/")))
-            self.__generate_tree(
+            _generate_tree(
                 self,
                 ws_resourcer,
                 iterable_path,
                 ws_resource
             )
+
+    def __check_http(self, resources, method):
+        for uri in resources:
+            resource = self._http_resources.get(uri)
+            if resource is None or method not in resource.methods:
+                raise ValueError(
+                    "{} is not an HTTP resource that supports {}.".format(
+                        uri,
+                        method,
+                    )
+                )
+
+    def __readable(self, resources):
+        if resources is None:
+            return [
+                uri for uri, resource in self._http_resources.items()
+                if "GET" in resource.methods
+            ]
+        resources = list(resources)
+        self.__check_http(resources, "GET")
+        return resources
+
+    @staticmethod
+    def __batch_result(resources, outcomes):
+        """Split what each request returned or raised, in the order of the
+        resources, into a :class:`_BatchResult`.
+        """
+        results = {}
+        errors = {}
+        for uri, outcome in zip(resources, outcomes):
+            # a cancelled request is not an Exception since Python 3.8
+            if isinstance(outcome, BaseException):
+                errors[uri] = outcome
+            else:
+                results[uri] = outcome
+        return _BatchResult(results, errors)
+
+    def __batch(self, request, resources):
+        # the blocking requests, each from a thread of its own
+        workers = max(min(len(resources), self._http_resourcer._pool_size), 1)
+        with ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(request, uri) for uri in resources]
+        return self.__batch_result(resources, [
+            future.exception() or future.result() for future in futures
+        ])
+
+    async def __batch_async(self, request, resources):
+        outcomes = await asyncio.gather(
+            *(request(uri) for uri in resources),
+            return_exceptions=True,
+        )
+        return self.__batch_result(resources, outcomes)
+
+    @staticmethod
+    def __stages(settings):
+        """The uris of the settings in the order they are applied: each of
+        the initialization ones alone, in the given order, and then the
+        rest at once.
+        """
+        first = [
+            uri for uri in settings
+            if uri.rsplit("/", 1)[-1] in _INITIALIZATION_RESOURCES
+        ]
+        rest = [uri for uri in settings if uri not in first]
+        return [[uri] for uri in first] + [rest]
+
+    @staticmethod
+    def __merge(batches):
+        results = {}
+        errors = {}
+        for batch in batches:
+            results.update(batch.results)
+            errors.update(batch.errors)
+        return _BatchResult(results, errors)
+
+    def configure(self, settings):
+        """Sets the value of many HTTP resources at once. The requests are
+        sent concurrently, through the pool of connections, so it takes
+        about as long as the slowest one instead of all of them:
+
+        .. code-block:: python
+
+            aero.configure({
+                "/propeller/pwm/status": "initialized",
+                "/telemetry/period": 20,
+                "/logger/level": "LOG_INFO",
+            })
+
+        Resources that other settings depend on, the ones named
+        ``status`` like ``/propeller/pwm/status``, are set first, one after
+        the other in the given order, and then the rest concurrently, in no
+        particular order. A failed request does not stop the rest, check
+        the errors of the result.
+
+        :param settings: The value of each resource, by uri.
+        :type settings: dict
+
+        :return: The code returned by each post, and the errors.
+        :rtype: :class:`_BatchResult`
+        """
+        self.__check_http(settings, "POST")
+        return self.__merge(
+            self.__batch(
+                lambda uri: self._http_resourcer.post(uri, settings[uri]),
+                stage,
+            )
+            for stage in self.__stages(settings)
+        )
+
+    def snapshot(self, resources=None):
+        """Gets the value of many HTTP resources at once, concurrently, as
+        :meth:`System.configure`.
+
+        :param resources: The uris of the resources, by default every HTTP
+                          resource that can be read.
+        :type resources: iterable of str
+
+        :return: The value of each resource, and the errors.
+        :rtype: :class:`_BatchResult`
+        """
+        return self.__batch(
+            self._http_resourcer.get,
+            self.__readable(resources),
+        )
+
+    async def configure_async(self, settings):
+        """The awaitable version of :meth:`System.configure`, that does not
+        block the event loop, e.g. from the async hooks of an
+        :class:`~nyquist.control.Experiment`. The initialization resources
+        are set first as well.
+
+        :param settings: The value of each resource, by uri.
+        :type settings: dict
+
+        :return: The code returned by each post, and the errors.
+        :rtype: :class:`_BatchResult`
+        """
+        self.__check_http(settings, "POST")
+        batches = []
+        for stage in self.__stages(settings):
+            batches.append(await self.__batch_async(
+                lambda uri: self._http_resourcer.post_async(
+                    uri,
+                    settings[uri]
+                ),
+                stage,
+            ))
+        return self.__merge(batches)
+
+    async def snapshot_async(self, resources=None):
+        """The awaitable version of :meth:`System.snapshot`.
+
+        :param resources: The uris of the resources, by default every HTTP
+                          resource that can be read.
+        :type resources: iterable of str
+
+        :return: The value of each resource, and the errors.
+        :rtype: :class:`_BatchResult`
+        """
+        return await self.__batch_async(
+            self._http_resourcer.get_async,
+            self.__readable(resources),
+        )
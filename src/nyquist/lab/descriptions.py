@@ -14,6 +14,7 @@ aeropendulum_description = _SystemDescription(
     http_timeout=2,
     ws_timeout=1,
     ws_get_mode="new",
+    ws_history=4096,
     http_resources=_AEROPENDULUM_HTTP_RESOURCES,
     ws_resources=_AEROPENDULUM_WS_RESOURCES,
 )
@@ -25,6 +26,7 @@ motor_encoder_description = _SystemDescription(
     http_timeout=2,
     ws_timeout=1,
     ws_get_mode="new",
+    ws_history=4096,
     http_resources=_MOTOR_ENCODER_HTTP_RESOURCES,
     ws_resources=_MOTOR_ENCODER_WS_RESOURCES,
 )
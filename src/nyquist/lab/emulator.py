@@ -0,0 +1,441 @@
+import argparse
+import asyncio
+import functools
+import http
+import json
+import logging
+import math
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl
+
+import websockets
+from websockets.exceptions import InvalidMessage
+from websockets.http import Headers
+from websockets.protocol import State
+
+from nyquist._private.assets.resource_descriptions import (
+    _AERO_DEGREE_PER_PULSE,
+    _AERO_DUTY_MAX,
+    _AERO_DUTY_ZERO,
+    _AERO_START_ANGLE_DEG,
+    _AEROPENDULUM_HTTP_RESOURCES,
+    _AEROPENDULUM_WS_RESOURCES,
+)
+from nyquist._private.network.base import _binary_frame
+
+
+_logger = logging.getLogger(__name__)
+
+
+_AERO_BINARY_FRAME = _binary_frame([
+    resource.codec
+    for resource in _AEROPENDULUM_WS_RESOURCES
+    if "GET" in resource.methods
+])
+
+
+class PendulumPlant:
+    """A simple model of the aeropendulum: a pendulum pushed by a propeller.
+
+    .. math::
+
+        \\ddot{\\theta} = k_u (u - u_0) - k_g \\sin(\\theta)
+            - k_d \\dot{\\theta}
+
+    Where :math:`u` is the duty percentage. The pendulum rests on a stop at
+    22 degrees, as the real one. The default constants give a steady state
+    close to the calibration of the real aeropendulum,
+    :math:`u = u_0 + (k_g / k_u) \\sin(\\theta)`.
+
+    :param gravity_gain: :math:`k_g` [1/s²].
+    :type gravity_gain: float
+    :param duty_gain: :math:`k_u` [1/s²/%].
+    :type duty_gain: float
+    :param duty_offset: :math:`u_0` [%].
+    :type duty_offset: float
+    :param damping: :math:`k_d` [1/s].
+    :type damping: float
+    :param max_step_s: The maximum integration step [s].
+    :type max_step_s: float
+    """
+    def __init__(
+        self,
+        gravity_gain=30.0,
+        duty_gain=30.0 / 41.68,
+        duty_offset=4.57,
+        damping=1.5,
+        max_step_s=0.001,
+    ):
+        self.gravity_gain = gravity_gain
+        self.duty_gain = duty_gain
+        self.duty_offset = duty_offset
+        self.damping = damping
+        self.max_step_s = max_step_s
+        self.min_angle_rad = math.radians(_AERO_START_ANGLE_DEG)
+        self.max_angle_rad = math.pi
+        self.angle_rad = self.min_angle_rad
+        self.speed_rad_s = 0.0
+        self.duty_percent = 0.0
+
+    def step(self, time_s):
+        """Integrate the model for some time, with the current duty.
+
+        :param time_s: The time to integrate [s].
+        :type time_s: float
+        """
+        while time_s > 0:
+            dt = min(time_s, self.max_step_s)
+            time_s -= dt
+            thrust = max(self.duty_percent - self.duty_offset, 0)
+            acceleration = (
+                self.duty_gain * thrust -
+                self.gravity_gain * math.sin(self.angle_rad) -
+                self.damping * self.speed_rad_s
+            )
+            self.speed_rad_s += acceleration * dt
+            self.angle_rad += self.speed_rad_s * dt
+            if self.angle_rad <= self.min_angle_rad:
+                self.angle_rad = self.min_angle_rad
+                self.speed_rad_s = max(self.speed_rad_s, 0)
+            elif self.angle_rad >= self.max_angle_rad:
+                self.angle_rad = self.max_angle_rad
+                self.speed_rad_s = min(self.speed_rad_s, 0)
+
+    @property
+    def angle_deg(self):
+        """The angle of the pendulum [deg]."""
+        return math.degrees(self.angle_rad)
+
+
+class _EmulatorProtocol(websockets.WebSocketServerProtocol):
+    """Serves the HTTP resources of the emulator, and the ``/stream``
+    websocket, on the same port, as the device does.
+
+    The HTTP connections are kept alive, answering one request after the
+    other, until a request opens the websocket, or the client closes the
+    connection (or asks to, with ``Connection: close``).
+    """
+    def __init__(self, *args, emulator, **kwargs):
+        self._emulator = emulator
+        super().__init__(*args, **kwargs)
+
+    async def read_http_request(self):
+        requests = 0
+        while True:
+            try:
+                path, headers = await super().read_http_request()
+            except InvalidMessage:
+                if self.reader.at_eof():
+                    # closed by the client between two requests
+                    raise ConnectionResetError("Connection closed.")
+                raise
+            if urlparse(path).path == "/stream":
+                # continue with the websocket handshake
+                return path, headers
+
+            if not requests:
+                self._emulator.http_connections += 1
+            requests += 1
+            status, body = self._emulator._http_response(path)
+            body = (body + "\n").encode()
+            close = headers.get("Connection", "").lower() == "close"
+            response_headers = Headers()
+            response_headers["Content-Type"] = "text/plain"
+            response_headers["Content-Length"] = str(len(body))
+            if close:
+                response_headers["Connection"] = "close"
+            self.write_http_response(status, response_headers, body)
+            if close:
+                raise ConnectionAbortedError("Closed after the response.")
+
+    async def close(self, code=1000, reason=""):
+        if self.state is State.CONNECTING:
+            # still serving HTTP, there is no websocket to close
+            self.transport.close()
+            return
+        await super().close(code, reason)
+
+
+class Emulator:
+    """A local stand-in for the aeropendulum, serving the same HTTP and
+    websocket API, driven by a :class:`PendulumPlant`. Useful to test and
+    benchmark without the real device.
+
+    It runs its own event loop in a background thread, so it can be used
+    from synchronous code:
+
+    .. code-block:: python
+
+        with Emulator() as emulator:
+            aero = System(
+                "aeropendulum",
+                ip="127.0.0.1",
+                http_port=emulator.port,
+                ws_port=emulator.port,
+            )
+
+    The HTTP resources follow the ``?verb=`` convention of the device
+    (see :meth:`~nyquist._private.network.http._HTTPConnection.request`),
+    over keep-alive connections, and the ``/stream`` websocket sends the
+    hex encoded ``angle`` every ``/telemetry/period`` milliseconds, and
+    receives hex encoded ``duty`` commands. Invalid commands are logged and
+    ignored, as the device does. With ``binary``, the telemetry
+    is sent as compact binary frames instead (see
+    :func:`~nyquist._private.network.base._binary_frame`).
+
+    :param host: The address to listen at.
+    :type host: str
+    :param port: The port to listen at, 0 picks a free one.
+    :type port: int
+    :param telemetry_period_ms: The initial telemetry period [ms].
+    :type telemetry_period_ms: float
+    :param plant: The model of the device.
+    :type plant: :class:`PendulumPlant`
+    :param binary: Whether to send binary telemetry frames.
+    :type binary: bool
+    """
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        telemetry_period_ms=20,
+        plant=None,
+        binary=False,
+    ):
+        self.host = host
+        self.port = port
+        self.plant = plant or PendulumPlant()
+        self.binary = binary
+        self._resources = {
+            resource.uri: resource for resource in _AEROPENDULUM_HTTP_RESOURCES
+        }
+        self._values = {
+            "/logger/level": "LOG_INFO",
+            "/propeller/pwm/status": "disabled",
+            "/telemetry/period": str(telemetry_period_ms),
+            "/test/resource": "",
+            "/test/parent_resource/child_a": "",
+            "/test/parent_resource/child_b": "",
+        }
+        self._plant_ts = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+        self.http_requests = 0
+        self.http_connections = 0
+        self.telemetry_messages = 0
+        self.commands = 0
+        self.invalid_commands = 0
+        self.last_command_ts = None
+
+    @property
+    def telemetry_period_s(self):
+        """The current telemetry period [s]."""
+        return float(self._values["/telemetry/period"]) / 1000
+
+    def _advance_plant(self):
+        now = time.monotonic()
+        if self._plant_ts is not None:
+            self.plant.step(now - self._plant_ts)
+        self._plant_ts = now
+
+    def _set_duty(self, duty_percent):
+        self._advance_plant()
+        if self._values["/propeller/pwm/status"] != "initialized":
+            duty_percent = 0
+        self.plant.duty_percent = duty_percent
+
+    @staticmethod
+    def _angle_pulses(angle_deg):
+        pulses = round(
+            (angle_deg - _AERO_START_ANGLE_DEG) / _AERO_DEGREE_PER_PULSE
+        )
+        return max(pulses, 0)
+
+    @staticmethod
+    def _decode_duty(duty_aero):
+        return (
+            (duty_aero - _AERO_DUTY_ZERO) /
+            (_AERO_DUTY_MAX - _AERO_DUTY_ZERO) * 100
+        )
+
+    def telemetry_message(self):
+        """The telemetry message for the current state of the plant.
+
+        :rtype: str or bytes
+        """
+        self._advance_plant()
+        pulses = self._angle_pulses(self.plant.angle_deg)
+        if self.binary:
+            return _AERO_BINARY_FRAME.pack(pulses)
+        return json.dumps({
+            "angle": "0x{:04X}".format(pulses),
+            "error": "0x0000",
+        })
+
+    def _http_response(self, path):
+        """Answer a request following the ``?verb=`` convention."""
+        self.http_requests += 1
+        parsed_url = urlparse(path)
+        query = dict(parse_qsl(parsed_url.query, keep_blank_values=True))
+        uri = parsed_url.path.rstrip("/")
+        verb = query.get("verb", "GET")
+
+        if not uri:
+            return http.HTTPStatus.OK, "aeropendulum emulator"
+        if uri not in self._resources:
+            return http.HTTPStatus.NOT_FOUND, "unknown resource"
+        if verb not in self._resources[uri].methods:
+            return http.HTTPStatus.METHOD_NOT_ALLOWED, "invalid verb"
+
+        if verb == "POST":
+            if "value" not in query:
+                return http.HTTPStatus.BAD_REQUEST, "missing value"
+            self._values[uri] = query["value"]
+            if uri == "/propeller/pwm/status":
+                self._set_duty(self.plant.duty_percent)
+            return http.HTTPStatus.OK, query["value"]
+
+        if uri == "/test/parent_resource":
+            return http.HTTPStatus.OK, json.dumps({
+                child: self._values[uri + "/" + child]
+                for child in ("child_a", "child_b")
+            })
+        return http.HTTPStatus.OK, self._values[uri]
+
+    async def _send_telemetry(self, ws):
+        deadline = time.monotonic()
+        while True:
+            await ws.send(self.telemetry_message())
+            self.telemetry_messages += 1
+            deadline = max(
+                deadline + self.telemetry_period_s,
+                time.monotonic()
+            )
+            await asyncio.sleep(deadline - time.monotonic())
+
+    def _on_command(self, message):
+        received_ts = time.monotonic()
+        try:
+            command = json.loads(message)
+            duty = command.get("duty")
+            if duty is not None:
+                duty = self._decode_duty(int(duty, 16))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # a bad command must not close the stream
+            self.invalid_commands += 1
+            _logger.warning("Invalid command ignored: %r", message)
+            return
+        self.last_command_ts = received_ts
+        self.commands += 1
+        if duty is not None:
+            self._set_duty(duty)
+
+    async def _stream(self, ws, path):
+        sender = asyncio.ensure_future(self._send_telemetry(ws))
+        try:
+            async for message in ws:
+                self._on_command(message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            sender.cancel()
+
+    async def _serve(self):
+        self._server = await websockets.serve(
+            self._stream,
+            self.host,
+            self.port,
+            create_protocol=functools.partial(
+                _EmulatorProtocol,
+                emulator=self,
+            ),
+            close_timeout=0.1,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            self._loop.close()
+            return
+        self._started.set()
+        self._loop.run_forever()
+
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def start(self):
+        """Start serving in a background thread, returns once the emulator
+        is listening.
+        """
+        self._plant_ts = time.monotonic()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+
+    def stop(self):
+        """Stop serving, and wait for the background thread to finish."""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._started.clear()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a local aeropendulum emulator."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--telemetry-period-ms",
+        type=float,
+        default=20,
+        help="initial telemetry period, down to 1 ms",
+    )
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="send binary telemetry frames instead of JSON",
+    )
+    args = parser.parse_args()
+
+    emulator = Emulator(
+        args.host,
+        args.port,
+        args.telemetry_period_ms,
+        binary=args.binary,
+    )
+    emulator.start()
+    print("Serving on {}:{}".format(emulator.host, emulator.port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
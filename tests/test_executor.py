@@ -1,6 +1,17 @@
-from unittest import TestCase
+import asyncio
+import queue
+import time
+from unittest import TestCase, mock
 
-from nyquist.control import Experiment
+from nyquist.control import (
+    Experiment,
+    Fleet,
+    FleetResult,
+    HybridClock,
+    LoopTiming,
+    Runner,
+    VirtualClock,
+)
 
 
 class MyControlExperiment(Experiment):
@@ -14,6 +25,52 @@ class MyControlExperiment(Experiment):
         self.my_global += 1
 
 
+class MySlowExperiment(MyControlExperiment):
+    def in_the_loop(self):
+        self.my_global += 1
+        time.sleep(0.02)
+
+
+class MyAsyncExperiment(Experiment):
+    async def before_the_loop(self):
+        await asyncio.sleep(0)
+        self.my_global = 0
+
+    async def in_the_loop(self):
+        await asyncio.sleep(0)
+        self.my_global += 1
+
+    async def after_the_loop(self):
+        await asyncio.sleep(0)
+        self.my_global += 1
+
+
+class MyTriggeredExperiment(MyControlExperiment):
+    async def trigger(self):
+        await asyncio.sleep(0.01)
+        self.events += 1
+
+    def before_the_loop(self):
+        super().before_the_loop()
+        self.events = 0
+        self.set_loop_trigger(self.trigger, decimation=2)
+
+
+class MyStalledExperiment(MyControlExperiment):
+    async def trigger(self):
+        # an event that never arrives
+        await asyncio.get_event_loop().create_future()
+
+    def before_the_loop(self):
+        super().before_the_loop()
+        self.set_loop_trigger(self.trigger)
+
+
+class MyFailingExperiment(MyControlExperiment):
+    def in_the_loop(self):
+        raise RuntimeError("oops")
+
+
 class MyIncompleteExperiment(Experiment):
     def in_the_loop(self):
         self.hi = "hi!"
@@ -31,6 +88,387 @@ class ExecutorTestCase(TestCase):
 
         self.assertEqual(exp.my_global, 3)
 
+    def test_async_hooks(self):
+        exp = MyAsyncExperiment()
+        exp.set_loop_frequency(frequency_hz=10)
+        exp.set_before_loop_time(0.1)
+        exp.set_after_loop_time(0.1)
+        exp.set_run_time(time_s=0.25)
+
+        exp.run()
+
+        self.assertEqual(exp.my_global, 3)
+
+    def test_triggered_loop(self):
+        exp = MyTriggeredExperiment()
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.2)
+
+        exp.run()
+
+        # one iteration every two events, plus the after_the_loop
+        self.assertEqual(exp.my_global, exp.events // 2 + 1)
+        self.assertGreater(exp.events, 10)
+
+        # scheduled at the event, and woken up later
+        stats = exp.get_loop_stats(percentiles=(0, 100))
+        self.assertGreaterEqual(stats.lateness_percentiles_s[0], 0)
+        self.assertGreater(stats.lateness_percentiles_s[100], 0)
+        self.assertLess(stats.lateness_percentiles_s[100], 0.01)
+        self.assertGreater(stats.mean_period_s, 0.015)
+
+        with self.assertRaises(ValueError):
+            exp.set_loop_trigger(exp.trigger, decimation=0)
+
+    def test_triggered_loop_ends_on_the_clock(self):
+        exp = MyStalledExperiment()
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=100)
+        exp.set_clock(VirtualClock())
+
+        start = time.monotonic()
+        exp.run()
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(exp.clock.now(), 100)
+        # only the after_the_loop
+        self.assertEqual(exp.my_global, 1)
+
     def test_raise_if_incomplete(self):
         with self.assertRaises(TypeError):
             MyIncompleteExperiment()
+
+    def test_absolute_scheduler_does_not_drift(self):
+        exp = MySlowExperiment()
+        exp.set_loop_frequency(frequency_hz=20)
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.5)
+        exp.set_scheduler("absolute")
+
+        exp.run()
+
+        # 10 iterations + before + after, a relative scheduler would only
+        # get through ~7 iterations
+        self.assertGreaterEqual(exp.my_global, 11)
+        self.assertLessEqual(exp.my_global, 13)
+
+    def test_overrun_policies(self):
+        exp = MyControlExperiment()
+        exp.set_loop_frequency(frequency_hz=10)
+
+        exp.set_scheduler("absolute", overrun_policy="skip")
+        grid_start, k, deadline = exp._next_deadline(0, 1, 0.05)
+        self.assertEqual((grid_start, k), (0, 1))
+        self.assertAlmostEqual(deadline, 0.1)
+        grid_start, k, deadline = exp._next_deadline(0, 1, 0.25)
+        self.assertEqual((grid_start, k), (0, 3))
+        self.assertAlmostEqual(deadline, 0.3)
+
+        exp.set_scheduler("absolute", overrun_policy="catch-up")
+        grid_start, k, deadline = exp._next_deadline(0, 1, 0.25)
+        self.assertEqual((grid_start, k), (0, 1))
+        self.assertAlmostEqual(deadline, 0.1)
+
+        exp.set_scheduler("absolute", overrun_policy="shift")
+        grid_start, k, deadline = exp._next_deadline(0, 1, 0.25)
+        self.assertAlmostEqual(grid_start, 0.15)
+        self.assertEqual(k, 1)
+        self.assertAlmostEqual(deadline, 0.25)
+
+    def test_invalid_scheduler(self):
+        exp = MyControlExperiment()
+        with self.assertRaises(ValueError):
+            exp.set_scheduler("whenever")
+        with self.assertRaises(ValueError):
+            exp.set_scheduler("absolute", overrun_policy="panic")
+
+    def test_loop_stats(self):
+        exp = MySlowExperiment()
+        exp.set_loop_frequency(frequency_hz=20)
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.3)
+        exp.set_scheduler("absolute")
+        self.assertIsNone(exp.get_loop_stats())
+
+        exp.run()
+
+        stats = exp.get_loop_stats(percentiles=(50, 100), bins=4)
+        self.assertEqual(stats.iterations, exp.my_global - 1)
+        self.assertEqual(stats.samples, stats.iterations)
+        self.assertEqual(stats.period_s, 0.05)
+        self.assertAlmostEqual(stats.mean_period_s, 0.05, delta=0.01)
+        self.assertGreaterEqual(stats.duration_percentiles_s[50], 0.02)
+        self.assertEqual(stats.overruns, 0)
+        self.assertEqual(sum(stats.histogram[1]), stats.samples)
+        self.assertEqual(len(stats.histogram[0]), 5)
+
+    def test_hybrid_clock(self):
+        clock = HybridClock(spin_threshold_s=0.003)
+
+        async def sleep_many():
+            overshoots = []
+            for _ in range(20):
+                deadline = time.perf_counter() + 0.005
+                await clock.sleep_until(deadline)
+                overshoots.append(time.perf_counter() - deadline)
+            return overshoots
+
+        # it never wakes early, and the spin gets close to the deadline at
+        # least when the OS does not preempt it, as under load
+        loop = asyncio.new_event_loop()
+        try:
+            overshoots = sorted(loop.run_until_complete(sleep_many()))
+        finally:
+            loop.close()
+        self.assertGreaterEqual(overshoots[0], 0)
+        self.assertLess(overshoots[0], 0.001)
+        self.assertGreater(clock.spin_time_s, 0)
+        self.assertGreater(clock.sleep_time_s, 0)
+
+        # only a sanity check of the loop, it's slower under load
+        exp = MyControlExperiment()
+        exp.set_loop_frequency(frequency_hz=200)
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.2)
+        exp.set_scheduler("absolute")
+        exp.set_clock(HybridClock(spin_threshold_s=0.003))
+
+        exp.run()
+
+        stats = exp.get_loop_stats()
+        self.assertGreater(stats.mean_period_s, 0.004)
+        self.assertLess(stats.mean_period_s, 0.02)
+        self.assertGreater(exp.clock.spin_time_s, 0)
+        self.assertGreater(exp.clock.sleep_time_s, 0)
+        self.assertGreater(exp.clock.cpu_usage, 0)
+
+    def test_clock_reset_on_run(self):
+        exp = MyControlExperiment()
+        exp.set_loop_frequency(frequency_hz=20)
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.2)
+
+        for _ in range(2):
+            # idle time before running is not accounted
+            time.sleep(0.2)
+            exp.run()
+            self.assertAlmostEqual(exp.clock.sleep_time_s, 0.2, delta=0.05)
+            self.assertGreater(exp.clock.cpu_usage, 0)
+
+    def test_virtual_clock(self):
+        exp = MyAsyncExperiment()
+        exp.set_loop_frequency(frequency_hz=20)
+        exp.set_before_loop_time(1)
+        exp.set_after_loop_time(1)
+        exp.set_run_time(time_s=120)
+        exp.set_scheduler("absolute")
+        exp.set_clock(VirtualClock())
+
+        start = time.monotonic()
+        exp.run()
+
+        self.assertLess(time.monotonic() - start, 2)
+        # the run time includes the before loop time
+        self.assertEqual(exp.my_global, 119 * 20 + 1)
+        self.assertAlmostEqual(exp.clock.now(), 121)
+        stats = exp.get_loop_stats(percentiles=(100, ))
+        self.assertAlmostEqual(stats.mean_period_s, 0.05)
+        self.assertAlmostEqual(stats.max_jitter_s, 0)
+
+    def test_virtual_clock_scheduling(self):
+        # the absolute scheduler, without the noise of the real time
+        exp = MyControlExperiment()
+        exp.set_loop_frequency(frequency_hz=200)
+        exp.set_before_loop_time(0)
+        exp.set_run_time(time_s=0.2)
+        exp.set_scheduler("absolute")
+        exp.set_clock(VirtualClock())
+
+        exp.run()
+
+        stats = exp.get_loop_stats(percentiles=(50, 100))
+        self.assertEqual(stats.iterations, 40)
+        self.assertAlmostEqual(stats.mean_period_s, 0.005)
+        self.assertAlmostEqual(stats.lateness_percentiles_s[100], 0)
+        self.assertEqual(stats.overruns, 0)
+
+    def test_shared_virtual_clock(self):
+        clock = VirtualClock()
+        wakes = []
+
+        class MyLoggingExperiment(MyControlExperiment):
+            def in_the_loop(self):
+                wakes.append((clock.now(), self.name))
+
+        experiments = []
+        for name, frequency_hz in (("slow", 2), ("fast", 5)):
+            exp = MyLoggingExperiment()
+            exp.name = name
+            exp.set_loop_frequency(frequency_hz)
+            exp.set_before_loop_time(0)
+            exp.set_run_time(time_s=1)
+            exp.set_scheduler("absolute")
+            exp.set_clock(clock)
+            experiments.append(exp)
+
+        Runner(experiments).run()
+
+        times = [wake[0] for wake in wakes]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(len(wakes), 2 + 5)
+
+    def test_virtual_clock_waits_for_busy_experiments(self):
+        clock = VirtualClock()
+
+        class MyYieldingExperiment(MyControlExperiment):
+            async def in_the_loop(self):
+                # more than the event loop needs to wake the other one
+                for _ in range(5):
+                    await asyncio.sleep(0)
+                self.my_global += 1
+
+        experiments = []
+        for cls, frequency_hz in (
+            (MyYieldingExperiment, 10),
+            (MyControlExperiment, 7),
+        ):
+            exp = cls()
+            exp.set_loop_frequency(frequency_hz)
+            exp.set_before_loop_time(0)
+            exp.set_run_time(time_s=1)
+            exp.set_scheduler("absolute")
+            exp.set_clock(clock)
+            experiments.append(exp)
+
+        Runner(experiments).run()
+
+        yielding = experiments[0].get_loop_stats(percentiles=(100, ))
+        self.assertEqual(yielding.iterations, 10)
+        self.assertEqual(yielding.overruns, 0)
+        self.assertEqual(yielding.duration_percentiles_s[100], 0)
+        self.assertEqual(yielding.max_jitter_s, 0)
+        self.assertEqual(experiments[1].get_loop_stats().iterations, 7)
+
+
+class LoopTimingTestCase(TestCase):
+    def test_ring_buffer(self):
+        timing = LoopTiming(capacity=3)
+        timing.reset(period_s=1)
+        for i in range(5):
+            timing.record(i, i + 0.25 * i, 0.1)
+
+        self.assertEqual(len(timing), 3)
+        self.assertEqual(timing.scheduled, [2, 3, 4])
+        self.assertEqual(timing.duration, [0.1, 0.1, 0.1])
+
+        stats = timing.stats(percentiles=(0, 50, 100), bins=2)
+        self.assertEqual(stats.iterations, 5)
+        self.assertEqual(stats.samples, 3)
+        self.assertAlmostEqual(stats.lateness_percentiles_s[0], 0.5)
+        self.assertAlmostEqual(stats.lateness_percentiles_s[50], 0.75)
+        self.assertAlmostEqual(stats.max_jitter_s, 1)
+        # only i = 4 ends after the next scheduled wake-up
+        self.assertEqual(stats.overruns, 1)
+        self.assertEqual(stats.histogram[1], [1, 2])
+
+    def test_overruns(self):
+        timing = LoopTiming(capacity=10)
+        timing.reset(period_s=0.1)
+        timing.record(0, 0, 0.05)
+        timing.record(0.1, 0.1, 0.2)
+        self.assertEqual(timing.stats().overruns, 1)
+
+
+def _experiment(cls, frequency_hz=10):
+    exp = cls()
+    exp.set_loop_frequency(frequency_hz=frequency_hz)
+    exp.set_before_loop_time(0)
+    exp.set_run_time(time_s=0.25)
+    exp.set_scheduler("absolute")
+    return exp
+
+
+class RunnerTestCase(TestCase):
+    def test_concurrent_experiments(self):
+        fast = _experiment(MyControlExperiment, 20)
+        slow = _experiment(MyControlExperiment, 10)
+        runner = Runner([fast])
+        runner.add(slow)
+
+        start = time.monotonic()
+        results = runner.run()
+
+        # both run together, not one after the other
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(results, (None, None))
+        self.assertEqual(fast.my_global, 5 + 1)
+        self.assertEqual(slow.my_global, 3 + 1)
+
+        stats = runner.get_loop_stats()
+        self.assertEqual(stats.iterations, 5 + 3)
+        self.assertIsNone(stats.period_s)
+
+    def test_failing_experiment(self):
+        ok = _experiment(MyControlExperiment, 10)
+        failing = _experiment(MyFailingExperiment, 10)
+        runner = Runner([failing, ok])
+
+        results = runner.run()
+
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertIsNone(results[1])
+        # the after_the_loop ran anyway
+        self.assertEqual(failing.my_global, 1)
+        self.assertEqual(ok.my_global, 3 + 1)
+
+    def test_stop(self):
+        exp = _experiment(MyControlExperiment, 10)
+        exp.set_run_time(10)
+        runner = Runner([exp])
+        loop = asyncio.get_event_loop()
+        loop.call_later(0.15, runner.stop)
+
+        results = runner.run()
+
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual(exp.my_global, 2 + 1)
+
+
+class FleetTestCase(TestCase):
+    def test_fleet(self):
+        fleet = Fleet(workers=2)
+        for group in ("a", "a", "b"):
+            fleet.add(_experiment(MyControlExperiment), group=group)
+        failing_index = fleet.add(_experiment(MyFailingExperiment))
+
+        results = fleet.run()
+
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual([r.group for r in results], ["a", "a", "b", 3])
+        for result in results[:3]:
+            self.assertIsNone(result.exception)
+            self.assertEqual(result.data, {"my_global": 3 + 1})
+            self.assertEqual(result.stats.iterations, 3)
+
+        failing = results[failing_index]
+        self.assertIsInstance(failing.exception, RuntimeError)
+        self.assertIn("oops", failing.traceback)
+        self.assertEqual(failing.data, {"my_global": 1})
+
+    def test_results_sent_before_exiting(self):
+        # the worker reported one experiment and exited while the fleet was
+        # waiting, and it lost the other
+        process = mock.Mock(exitcode=0)
+        pending = {0: ("a", process), 1: ("a", process)}
+        results = queue.Queue()
+        reported = FleetResult(0, "a", {}, None, None, None)
+        results.put(reported)
+        results.put(reported)
+
+        finished = list(Fleet._finished(results, pending))
+
+        self.assertEqual(pending, {})
+        self.assertEqual(len(finished), 2)
+        self.assertIs(finished[0], reported)
+        self.assertEqual(finished[1].index, 1)
+        self.assertIsInstance(finished[1].exception, RuntimeError)
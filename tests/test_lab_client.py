@@ -1,11 +1,33 @@
 import asyncio
+import json
+import math
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import TestCase, IsolatedAsyncioTestCase, mock
 
-from nyquist.lab import System
-from nyquist._private.network.base import _Resource
+import numpy as np
+import websockets
+
+from nyquist.lab import System, TelemetryPublisher, TelemetryReader
+from nyquist.lab.emulator import Emulator, PendulumPlant
+from nyquist._private.network import base
+from nyquist._private.network.base import (
+    _Codec,
+    _Resource,
+    _binary_frame,
+    _compile_codec,
+    _compile_extractor,
+)
 from nyquist._private.network.http import (
     _HTTPConnection,
     _HTTPResourcer,
+    _compile_urls,
+    _value_url,
+    _verb_url,
 )
 from nyquist._private.network.ws import _WSResourcer
 
@@ -88,7 +110,7 @@ class ResourcerTestCase(TestCase):
         self.assertEqual(res, "some_funny_value")
 
         self.assertEqual(
-            mock.call("GET", "/some/funny/resource"),
+            mock.call("GET", "/some/funny/resource", None),
             mock_request.call_args,
         )
 
@@ -98,10 +120,149 @@ class ResourcerTestCase(TestCase):
         self.assertEqual(res, 200)
 
         self.assertEqual(
-            mock.call("POST", "/some/unfunny/resource?value=" + str(10)),
+            mock.call(
+                "POST",
+                "/some/unfunny/resource?value=" + str(10),
+                None,
+            ),
             mock_request.call_args,
         )
 
+    def test_compiled_urls(self, mock_getresponse, mock_request):
+        mock_getresponse.return_value = self.mock_response_object
+        self.resourcer.compile_urls("/some/funny/resource")
+
+        self.resourcer.get("/some/funny/resource")
+        self.assertEqual(
+            mock.call(
+                "GET",
+                "/some/funny/resource",
+                "/some/funny/resource?verb=GET",
+            ),
+            mock_request.call_args,
+        )
+
+        self.resourcer.post("/some/funny/resource", 10)
+        self.assertEqual(
+            mock.call(
+                "POST",
+                "/some/funny/resource",
+                "/some/funny/resource?value=10&verb=POST",
+            ),
+            mock_request.call_args,
+        )
+
+        # the same urls as building them on every request
+        urls = _compile_urls("/some/funny/resource")
+        for value in (10, 1.5, "some text", "a&b=c", "", "ñ", b"raw"):
+            self.assertEqual(
+                urls.post(value),
+                _verb_url(
+                    "POST",
+                    _value_url("/some/funny/resource", value)
+                ),
+            )
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        body = b"some_value\n"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path.startswith("/close"):
+            # as a board that drops idle connections, without telling
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPKeepAliveTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.server.connections = 0
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            args=(0.01, ),
+        )
+        self.thread.start()
+        self.resourcer = _HTTPResourcer(
+            "127.0.0.1",
+            self.server.server_address[1],
+            2,
+            pool_size=2,
+        )
+
+    def tearDown(self):
+        self.resourcer.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_unread_responses(self):
+        # the body of a post is not read, but it does not break the next one
+        for _ in range(3):
+            self.assertEqual(self.resourcer.post("/some/resource", 1), 200)
+            self.assertEqual(
+                self.resourcer.get("/some/resource"),
+                "some_value"
+            )
+        self.assertEqual(self.server.connections, 1)
+
+    def test_closed_by_the_server(self):
+        self.resourcer.get("/close")
+        self.assertEqual(self.resourcer.get("/some/resource"), "some_value")
+        self.assertEqual(self.server.connections, 2)
+
+    def test_concurrent_requests(self):
+        with ThreadPoolExecutor(4) as executor:
+            values = list(executor.map(
+                lambda _: self.resourcer.get("/some/resource"),
+                range(40)
+            ))
+        self.assertEqual(values, ["some_value"] * 40)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_async_requests(self):
+        async def requests():
+            for _ in range(3):
+                self.assertEqual(
+                    await self.resourcer.post_async("/some/resource", 1),
+                    200,
+                )
+                self.assertEqual(
+                    await self.resourcer.get_async("/some/resource"),
+                    "some_value",
+                )
+            self.assertEqual(self.server.connections, 1)
+
+            await self.resourcer.get_async("/close")
+            self.assertEqual(
+                await self.resourcer.get_async("/some/resource"),
+                "some_value",
+            )
+            self.assertEqual(self.server.connections, 2)
+
+            values = await asyncio.gather(*(
+                self.resourcer.get_async("/some/resource")
+                for _ in range(40)
+            ))
+            self.assertEqual(values, ["some_value"] * 40)
+            self.assertLessEqual(self.server.connections, 3)
+            self.resourcer.close()
+
+        asyncio.run(requests())
+
 
 @mock.patch('websockets.client.WebSocketClientProtocol')
 @mock.patch('websockets.connect')
@@ -168,6 +329,229 @@ class WSResourcerTestCase(IsolatedAsyncioTestCase):
 
         self.assertEqual(result, 22)
 
+    async def test_wait_new(self, mock_connect, mock_client):
+        self.resourcer._connected = True
+        waiter = asyncio.ensure_future(
+            self.resourcer.wait_new("/sensors/encoder/angle")
+        )
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+
+        self.resourcer._on_message('{"angle": "0x0010", "error": "0x0000"}')
+        self.assertEqual(await waiter, 23)
+
+        # the value is still new for get
+        self.assertEqual(self.resourcer.get("/sensors/encoder/angle"), 23)
+
+        with self.assertRaises(ValueError):
+            await self.resourcer.wait_new("/fakeuri")
+
+    async def test_wait_new_timeout(self, mock_connect, mock_client):
+        self.resourcer._connected = True
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.resourcer.wait_new("/sensors/encoder/angle", 0.01)
+
+        loop = asyncio.get_event_loop()
+        loop.call_later(
+            0.01,
+            self.resourcer._on_message,
+            '{"angle": "0x0000", "error": "0x0000"}'
+        )
+        value = await self.resourcer.wait_new("/sensors/encoder/angle", 1)
+        self.assertEqual(value, 22)
+
+    def _telemetry(self, pulses):
+        self.resourcer._on_message(
+            '{{"angle": "0x{:04X}", "error": "0x0000"}}'.format(pulses)
+        )
+
+    async def test_get_since(self, mock_connect, mock_client):
+        resourcer = _WSResourcer("127.0.0.1", 80, 0.1, "last", history=4)
+        # do not open the (mocked) stream, the telemetry is faked
+        resourcer._connected = True
+        self.resourcer = resourcer
+        self.assertEqual(len(resourcer.get_since("/sensors/encoder/angle")), 0)
+
+        for pulses in range(6):
+            self._telemetry(pulses * 16)
+
+        samples = resourcer.get_since("/sensors/encoder/angle")
+        self.assertEqual(list(samples["seq"]), [2, 3, 4, 5])
+        self.assertEqual(list(samples["value"]), [24, 25, 26, 27])
+        timestamps = samples["timestamp"]
+        self.assertTrue(all(timestamps[1:] >= timestamps[:-1]))
+
+        samples = resourcer.get_since("/sensors/encoder/angle", 5)
+        self.assertEqual(list(samples["value"]), [27])
+
+        # nothing newer than the last message
+        for seq in (6, 10):
+            samples = resourcer.get_since("/sensors/encoder/angle", seq)
+            self.assertEqual(len(samples), 0)
+
+    async def test_get_all(self, mock_connect, mock_client):
+        resourcer = _WSResourcer("127.0.0.1", 80, 0.1, "all")
+        resourcer._connected = True
+        self.resourcer = resourcer
+        self._telemetry(0)
+        self._telemetry(16)
+        self.assertEqual(
+            list(resourcer.get("/sensors/encoder/angle")["value"]),
+            [22, 23]
+        )
+        self.assertEqual(len(resourcer.get("/sensors/encoder/angle")), 0)
+
+        self._telemetry(32)
+        self.assertEqual(
+            list(resourcer.get("/sensors/encoder/angle")["seq"]),
+            [2]
+        )
+
+        with self.assertRaises(ValueError):
+            _WSResourcer("127.0.0.1", 80, 0.1, "whatever")
+
+    async def test_subscribe(self, mock_connect, mock_client):
+        self.resourcer._connected = True
+        calls = []
+        async_calls = []
+
+        def callback(value, timestamp):
+            calls.append((value, timestamp))
+
+        async def async_callback(value, timestamp):
+            async_calls.append(value)
+
+        def faulty_callback(value, timestamp):
+            raise RuntimeError("oops")
+
+        angle_uri = "/sensors/encoder/angle"
+        self.resourcer.subscribe(angle_uri, faulty_callback)
+        self.resourcer.subscribe(angle_uri, callback)
+        self.resourcer.subscribe(angle_uri, async_callback)
+        loop = asyncio.get_event_loop()
+        loop.set_exception_handler(lambda loop, context: None)
+
+        self._telemetry(16)
+        await asyncio.sleep(0)
+        self.assertEqual(calls[0][0], 23)
+        self.assertEqual(async_calls, [23])
+
+        self.resourcer.unsubscribe(angle_uri, callback)
+        self._telemetry(32)
+        await asyncio.sleep(0)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(async_calls, [23, 24])
+
+        with self.assertRaises(ValueError):
+            self.resourcer.subscribe("/fakeuri", callback)
+
+    async def test_subscribe_bad_frames(self, mock_connect, mock_client):
+        self.resourcer._connected = True
+        values = []
+        messages = []
+        errors = []
+        angle_uri = "/sensors/encoder/angle"
+        self.resourcer.subscribe(
+            angle_uri,
+            lambda value, timestamp: values.append(value)
+        )
+        self.resourcer.on_message(
+            lambda seq, timestamp, values: messages.append(values)
+        )
+        loop = asyncio.get_event_loop()
+        loop.set_exception_handler(
+            lambda loop, context: errors.append(context["exception"])
+        )
+
+        # the bad values are reported, and skipped as the null ones
+        self.resourcer._on_message('{"angle": null, "error": "0x0000"}')
+        self.resourcer._on_message('{"angle": "not hex", "error": "0x0000"}')
+        self.resourcer._on_message(b"\x00")
+        self._telemetry(16)
+        self.assertEqual(values, [23])
+        self.assertEqual(messages, [(None, ), (None, ), (None, ), (23, )])
+        self.assertEqual(len(errors), 2)
+
+    async def test_telemetry_stats(self, mock_connect, mock_client):
+        self.resourcer._connected = True
+        angle_uri = "/sensors/encoder/angle"
+        self.assertIsNone(self.resourcer.telemetry_stats())
+        self.assertTrue(math.isnan(self.resourcer.age(angle_uri)))
+
+        # every 10 ms, but two messages are lost
+        received = (0, 0.01, 0.02, 0.05, 0.06)
+        with mock.patch("time.monotonic", return_value=100):
+            for _ in received:
+                self._telemetry(16)
+        self.resourcer._timestamps[:len(received)] = np.add(received, 100)
+
+        with mock.patch("time.monotonic", return_value=100.08):
+            self.assertEqual(self.resourcer.get(angle_uri), 23)
+            self.assertAlmostEqual(self.resourcer.age(angle_uri), 0.02)
+
+        stats = self.resourcer.telemetry_stats(0.01)
+        self.assertEqual(stats.messages, 5)
+        self.assertAlmostEqual(stats.max_interval_s, 0.03)
+        self.assertAlmostEqual(stats.max_jitter_s, 0.02)
+        self.assertEqual(stats.gaps, 1)
+        self.assertEqual(stats.lost_messages, 2)
+        self.assertEqual(stats.reads, 1)
+        self.assertAlmostEqual(stats.max_age_s, 0.02)
+        self.assertAlmostEqual(self.resourcer.telemetry_stats().period_s, 0.01)
+
+    async def test_coalesced_commands(self, mock_connect, mock_client):
+        resourcer = _WSResourcer(
+            "127.0.0.1", 80, 0.1, "last", command_max_age=0.05
+        )
+        # do not open the (mocked) stream, the commands are sent to a fake
+        resourcer._connected = True
+        ws = mock.MagicMock()
+        ws.send = mock.AsyncMock()
+
+        # posted while disconnected, only the newest one is kept
+        for duty in (10, 20, 30):
+            resourcer.post("/propeller/pwm/duty", duty)
+        self.assertEqual(resourcer.coalesced_commands, 2)
+
+        sender = asyncio.ensure_future(
+            resourcer._WSResourcer__send_pending(ws)
+        )
+        await asyncio.sleep(0.01)
+        self.assertEqual(
+            ws.send.call_args_list,
+            [mock.call('{"duty": "0x204F"}')]
+        )
+        self.assertEqual(resourcer.sent_commands, 1)
+
+        # a command that can not be sent waits for the next connection
+        ws.send.side_effect = websockets.ConnectionClosed(1006, "")
+        resourcer.post("/propeller/pwm/duty", 40)
+        await asyncio.sleep(0.01)
+        self.assertTrue(sender.done())
+        self.assertEqual(resourcer.sent_commands, 1)
+
+        # and is dropped if it gets too old
+        await asyncio.sleep(0.05)
+        ws.send.side_effect = None
+        sender = asyncio.ensure_future(
+            resourcer._WSResourcer__send_pending(ws)
+        )
+        await asyncio.sleep(0.01)
+        self.assertEqual(resourcer.dropped_commands, 1)
+        self.assertEqual(ws.send.call_count, 2)
+        sender.cancel()
+
+    async def test_backoff(self, mock_connect, mock_client):
+        resourcer = _WSResourcer(
+            "127.0.0.1", 80, 0.1, "last",
+            reconnect_delay=0.1,
+            max_reconnect_delay=1,
+        )
+        for failures, delay in ((0, 0.1), (1, 0.2), (3, 0.8), (10, 1)):
+            backoff = resourcer._backoff(failures)
+            self.assertGreaterEqual(backoff, delay / 2)
+            self.assertLessEqual(backoff, delay)
+
     async def test_fake_uris(self, mock_connect, mock_client):
         mock_context_manager_enter = mock_connect.return_value.__aenter__
         mock_recv = mock_context_manager_enter.return_value.recv
@@ -186,6 +570,88 @@ class WSResourcerTestCase(IsolatedAsyncioTestCase):
             await asyncio.sleep(0.01)
 
 
+class CodecTestCase(TestCase):
+    def test_formats(self):
+        decode, encode = _compile_codec(_Codec("angle", "hex", 0.0625, 22))
+        self.assertEqual(decode("0x0010"), 23)
+        self.assertEqual(encode(23), "0x10")
+        # truncated, not rounded
+        self.assertEqual(encode(23.06), "0x10")
+
+        decode, encode = _compile_codec(_Codec("count", "int"))
+        self.assertEqual(decode(12), 12)
+        self.assertEqual(encode(12.4), 12)
+        self.assertEqual(encode(12.9), 12)
+
+        decode, encode = _compile_codec(_Codec("angle", "float", scale=2))
+        self.assertEqual(decode("1.5"), 3)
+        self.assertEqual(encode(3), 1.5)
+
+        with self.assertRaises(ValueError):
+            _compile_codec(_Codec("angle", "whatever"))
+
+    def test_extractor(self):
+        message = '{"error": null, "angle": "0x0010", "speed": -1.5e2}'
+        # with and without orjson, the same values
+        for orjson in (None, mock.Mock(loads=json.loads)):
+            with mock.patch.object(base, "orjson", orjson):
+                extract_angle = _compile_extractor(_Codec("angle"))
+                extract_speed = _compile_extractor(_Codec("speed"))
+                extract_error = _compile_extractor(_Codec("error"))
+                extract_other = _compile_extractor(_Codec("other"))
+            self.assertEqual(extract_angle(message), "0x0010")
+            self.assertEqual(float(extract_speed(message)), -150)
+            self.assertIsNone(extract_error(message))
+            self.assertIsNone(extract_other(message))
+
+    def test_binary_frames(self):
+        resourcer = _WSResourcer("127.0.0.1", 80, 0.1, "last")
+        resourcer._connected = True
+        frame = _binary_frame([_Codec("angle", "hex")])
+        resourcer._on_message(frame.pack(16))
+        self.assertEqual(resourcer.get("/sensors/encoder/angle"), 23)
+
+    def test_lazy_decode(self):
+        resourcer = _WSResourcer("127.0.0.1", 80, 0.1, "last")
+        resourcer._connected = True
+        # nothing is decoded until read
+        resourcer._on_message('{"angle": "not hex"}')
+        resourcer._on_message('{"angle": "0x0010"}')
+        self.assertEqual(resourcer.get("/sensors/encoder/angle"), 23)
+
+        # the bad message is NaN, and reported only once
+        with mock.patch.object(_WSResourcer, "_report") as report:
+            samples = resourcer.get_since("/sensors/encoder/angle")
+            self.assertTrue(math.isnan(samples["value"][0]))
+            self.assertEqual(samples["value"][1], 23)
+            samples = resourcer.get_since("/sensors/encoder/angle", 1)
+            self.assertEqual(list(samples["value"]), [23])
+        self.assertEqual(report.call_count, 1)
+
+    def test_resources(self):
+        resourcer = _WSResourcer(
+            "127.0.0.1", 80, 0.1, "last",
+            resources=(
+                _Resource("/stream/angle", ["GET"], "", _Codec("angle")),
+                _Resource("/stream/duty", ["POST"], "", _Codec("duty")),
+            )
+        )
+        resourcer._connected = True
+        resourcer._on_message('{"angle": 12.5}')
+        self.assertEqual(resourcer.get("/stream/angle"), 12.5)
+        with self.assertRaises(ValueError):
+            resourcer.get("/sensors/encoder/angle")
+
+        # without a codec, a float under the last word of the uri
+        resourcer = _WSResourcer(
+            "127.0.0.1", 80, 0.1, "last",
+            resources=(_Resource("/stream/speed", ["GET"], ""), )
+        )
+        resourcer._connected = True
+        resourcer._on_message('{"speed": 3}')
+        self.assertEqual(resourcer.get("/stream/speed"), 3)
+
+
 @mock.patch('nyquist._private.network.ws._WSResourcer.get')
 @mock.patch('nyquist._private.network.ws._WSResourcer.post')
 @mock.patch('nyquist._private.network.http._HTTPResourcer.get')
@@ -257,19 +723,32 @@ class SystemTestCase(TestCase):
         self.assertListEqual(["uri"], attrs)
 
         attrs = get_public_attributes_list(self.system.hey.it_is.the.uri)
-        self.assertListEqual(["help", "get", "post"], attrs)
+        self.assertListEqual(
+            ["help", "get", "get_async", "post", "post_async"],
+            attrs,
+        )
 
         attrs = get_public_attributes_list(self.system.hey.it_is.another.uri)
-        self.assertListEqual(["help", "get"], attrs)
+        self.assertListEqual(["help", "get", "get_async"], attrs)
 
         attrs = get_public_attributes_list(self.system.hey.ws)
         self.assertListEqual(["uri", "uri2"], attrs)
 
         attrs = get_public_attributes_list(self.system.hey.ws.uri)
-        self.assertListEqual(["help", "get", "post"], attrs)
+        stream_attrs = [
+            "help",
+            "get",
+            "wait_new",
+            "get_since",
+            "subscribe",
+            "unsubscribe",
+            "age",
+            "telemetry_stats",
+        ]
+        self.assertListEqual(stream_attrs + ["post"], attrs)
 
         attrs = get_public_attributes_list(self.system.hey.ws.uri2)
-        self.assertListEqual(["help", "get"], attrs)
+        self.assertListEqual(stream_attrs, attrs)
 
     def test_calls(self, mock_post, mock_get, mock_ws_post, mock_ws_get):
         self.system.hey.it_is.the.uri.post("some")
@@ -303,6 +782,17 @@ class SystemTestCase(TestCase):
         with self.assertRaises(ValueError):
             System("this_system_does_not_exist")
 
+    def test_motor_encoder(
+        self,
+        mock_post,
+        mock_get,
+        mock_ws_post,
+        mock_ws_get
+    ):
+        motor = System("motor-encoder")
+        self.assertTrue(hasattr(motor.stream.angle, "wait_new"))
+        self.assertTrue(hasattr(motor.stream.duty, "post"))
+
     @mock.patch('builtins.print')
     def test_docs(
         self,
@@ -323,3 +813,384 @@ class SystemTestCase(TestCase):
             print.call_args,
             mock.call(self.my_http_resources[1].docs),
         )
+
+
+class EmulatorTestCase(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.emulator = Emulator(telemetry_period_ms=5)
+        self.emulator.start()
+        self.aero = System(
+            "aeropendulum",
+            ip="127.0.0.1",
+            http_port=self.emulator.port,
+            ws_port=self.emulator.port,
+        )
+
+    def tearDown(self):
+        self.aero._http_resourcer.close()
+        self.emulator.stop()
+
+    def test_http(self):
+        self.assertEqual(self.aero.telemetry.period.get(), "5")
+        self.assertEqual(self.aero.telemetry.period.post(10), 200)
+        self.assertEqual(self.aero.telemetry.period.get(), "10")
+        self.assertEqual(self.emulator.telemetry_period_s, 0.01)
+
+        self.aero.test.parent_resource.child_a.post("hey")
+        self.assertEqual(
+            self.aero.test.parent_resource.get(),
+            '{"child_a": "hey", "child_b": ""}',
+        )
+
+    async def test_async_http(self):
+        period = self.aero.telemetry.period
+        self.assertEqual(await period.get_async(), "5")
+        self.assertEqual(await period.post_async(10), 200)
+        self.assertEqual(await period.get_async(), "10")
+        self.assertEqual(self.emulator.telemetry_period_s, 0.01)
+        # over a single kept alive connection
+        self.assertEqual(self.emulator.http_connections, 1)
+
+        # the telemetry keeps arriving while requesting
+        angle = self.aero.sensors.encoder.angle
+        await asyncio.wait_for(angle.wait_new(), 1)
+        received = angle.telemetry_stats().messages
+        for _ in range(20):
+            await period.get_async()
+        await asyncio.sleep(0.05)
+        self.assertGreater(angle.telemetry_stats().messages, received)
+
+    def test_http_keep_alive(self):
+        period = self.aero.telemetry.period
+        for _ in range(5):
+            period.get()
+            period.post(5)
+        self.assertEqual(self.emulator.http_requests, 10)
+        self.assertEqual(self.emulator.http_connections, 1)
+
+        # concurrent requests use more connections of the pool
+        self.aero.snapshot()
+        self.assertLessEqual(self.emulator.http_connections, 4)
+
+        # the device reboots, the idle connections are reopened
+        port = self.emulator.port
+        self.emulator.stop()
+        self.emulator = Emulator(port=port, telemetry_period_ms=5)
+        self.emulator.start()
+        self.assertEqual(period.get(), "5")
+        self.assertEqual(self.emulator.http_connections, 1)
+
+    def test_configure(self):
+        configured = self.aero.configure({
+            "/propeller/pwm/status": "initialized",
+            "/telemetry/period": 10,
+            "/logger/level": "LOG_WARN",
+        })
+        self.assertEqual(configured.errors, {})
+        self.assertEqual(
+            configured.results,
+            {
+                "/propeller/pwm/status": 200,
+                "/telemetry/period": 200,
+                "/logger/level": 200,
+            },
+        )
+
+        snapshot = self.aero.snapshot()
+        self.assertEqual(snapshot.errors, {})
+        self.assertEqual(
+            snapshot.results["/propeller/pwm/status"],
+            "initialized",
+        )
+        self.assertEqual(snapshot.results["/telemetry/period"], "10")
+        self.assertEqual(snapshot.results["/logger/level"], "LOG_WARN")
+
+        with self.assertRaises(ValueError):
+            self.aero.configure({"/not/a/resource": 1})
+        with self.assertRaises(ValueError):
+            self.aero.snapshot(["/propeller/pwm/duty"])
+
+        self.emulator.stop()
+        snapshot = self.aero.snapshot(["/telemetry/period", "/logger/level"])
+        self.assertEqual(snapshot.results, {})
+        self.assertEqual(
+            sorted(snapshot.errors),
+            ["/logger/level", "/telemetry/period"],
+        )
+        self.assertIsInstance(snapshot.errors["/logger/level"], OSError)
+
+    def test_configure_order(self):
+        post = self.aero._http_resourcer.post
+        posted = []
+
+        def slow_post(uri, value):
+            if uri.endswith("/status"):
+                time.sleep(0.05)
+            posted.append(uri)
+            return post(uri, value)
+
+        # the status goes first, even if slower
+        with mock.patch.object(self.aero._http_resourcer, "post", slow_post):
+            configured = self.aero.configure({
+                "/telemetry/period": 10,
+                "/propeller/pwm/status": "initialized",
+                "/logger/level": "LOG_WARN",
+            })
+        self.assertEqual(configured.errors, {})
+        self.assertEqual(posted[0], "/propeller/pwm/status")
+        self.assertEqual(len(posted), 3)
+
+    async def test_configure_async_order(self):
+        post_async = self.aero._http_resourcer.post_async
+        posted = []
+
+        async def slow_post_async(uri, value):
+            if uri.endswith("/status"):
+                await asyncio.sleep(0.05)
+            posted.append(uri)
+            return await post_async(uri, value)
+
+        with mock.patch.object(
+            self.aero._http_resourcer, "post_async", slow_post_async
+        ):
+            configured = await self.aero.configure_async({
+                "/telemetry/period": 10,
+                "/propeller/pwm/status": "initialized",
+            })
+        self.assertEqual(configured.errors, {})
+        self.assertEqual(
+            posted,
+            ["/propeller/pwm/status", "/telemetry/period"]
+        )
+
+    async def test_configure_async(self):
+        configured = await self.aero.configure_async({
+            "/telemetry/period": 10,
+            "/logger/level": "LOG_WARN",
+        })
+        self.assertEqual(
+            configured.results,
+            {"/telemetry/period": 200, "/logger/level": 200},
+        )
+        snapshot = await self.aero.snapshot_async(
+            ["/telemetry/period", "/logger/level"]
+        )
+        self.assertEqual(
+            snapshot.results,
+            {"/telemetry/period": "10", "/logger/level": "LOG_WARN"},
+        )
+
+        self.emulator.stop()
+        snapshot = await self.aero.snapshot_async(["/telemetry/period"])
+        self.assertEqual(snapshot.results, {})
+        self.assertIsInstance(snapshot.errors["/telemetry/period"], OSError)
+
+    async def test_snapshot_async_cancelled(self):
+        get_async = self.aero._http_resourcer.get_async
+
+        async def cancelled_get(uri):
+            if uri == "/logger/level":
+                raise asyncio.CancelledError()
+            return await get_async(uri)
+
+        with mock.patch.object(
+            self.aero._http_resourcer, "get_async", cancelled_get
+        ):
+            snapshot = await self.aero.snapshot_async(
+                ["/telemetry/period", "/logger/level"]
+            )
+        self.assertEqual(snapshot.results, {"/telemetry/period": "5"})
+        self.assertIsInstance(
+            snapshot.errors["/logger/level"],
+            asyncio.CancelledError
+        )
+
+    async def test_telemetry_and_commands(self):
+        self.aero.propeller.pwm.status.post("initialized")
+        angle = await asyncio.wait_for(
+            self.aero.sensors.encoder.angle.wait_new(),
+            1
+        )
+        self.assertEqual(angle, 22)
+
+        self.aero.propeller.pwm.duty.post(50)
+        await asyncio.sleep(0.3)
+        self.assertEqual(self.emulator.commands, 1)
+        self.assertGreater(self.emulator.telemetry_messages, 20)
+        self.assertAlmostEqual(self.emulator.plant.duty_percent, 50, 1)
+        self.assertGreater(self.aero.sensors.encoder.angle.get(), 22)
+
+    async def test_invalid_commands(self):
+        uri = "ws://127.0.0.1:{}/stream".format(self.emulator.port)
+        async with websockets.connect(uri) as ws:
+            with self.assertLogs("nyquist.lab.emulator", "WARNING"):
+                for frame in ("garbage", "[1]", '{"duty": 5}', '{"duty": ""}'):
+                    await ws.send(frame)
+                await ws.send('{"duty": "0x1E61"}')
+                await asyncio.sleep(0.05)
+            self.assertEqual(self.emulator.invalid_commands, 4)
+            self.assertEqual(self.emulator.commands, 1)
+
+            # the stream is still open
+            received = self.emulator.telemetry_messages
+            await asyncio.sleep(0.05)
+            self.assertGreater(self.emulator.telemetry_messages, received)
+            self.assertTrue(ws.open)
+            await asyncio.wait_for(ws.recv(), 1)
+
+    async def test_reconnection(self):
+        resourcer = _WSResourcer(
+            "127.0.0.1", self.emulator.port, 0.1, "last",
+            reconnect_delay=0.01,
+            max_reconnect_delay=0.05,
+        )
+        events = []
+        resourcer.on_connect(lambda: events.append("connect"))
+        resourcer.on_disconnect(lambda: events.append("disconnect"))
+        self.assertFalse(resourcer.connected)
+
+        await resourcer.wait_connected(1)
+        self.assertTrue(resourcer.connected)
+        self.assertEqual(resourcer.connections, 1)
+
+        # the device reboots
+        port = self.emulator.port
+        self.emulator.stop()
+        await asyncio.sleep(0.3)
+        self.assertFalse(resourcer.connected)
+        self.assertGreater(resourcer.failed_connections, 1)
+        self.emulator = Emulator(port=port, telemetry_period_ms=5)
+        self.emulator.start()
+
+        await resourcer.wait_connected(1)
+        self.assertEqual(events, ["connect", "disconnect", "connect"])
+        self.assertEqual(resourcer.disconnections, 1)
+
+        await resourcer.close()
+        self.assertFalse(resourcer.connected)
+        self.assertEqual(resourcer.disconnections, 2)
+        await asyncio.sleep(0.1)
+        self.assertEqual(resourcer.connections, 2)
+
+    async def test_close_while_receiving(self):
+        emulator = Emulator(telemetry_period_ms=1)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        resourcer = _WSResourcer("127.0.0.1", emulator.port, 0.1, "last")
+        for _ in range(10):
+            await resourcer.wait_new("/sensors/encoder/angle", 1)
+            await asyncio.wait_for(resourcer.close(), 2)
+            self.assertFalse(resourcer.connected)
+
+    async def test_message_errors(self):
+        resourcer = _WSResourcer("127.0.0.1", self.emulator.port, 0.1, "last")
+        self.addAsyncCleanup(resourcer.close)
+        errors = []
+        asyncio.get_event_loop().set_exception_handler(
+            lambda loop, context: errors.append(context["exception"])
+        )
+        on_message = resourcer._on_message
+        messages = []
+
+        def faulty_on_message(message):
+            messages.append(message)
+            if len(messages) == 1:
+                raise RuntimeError("oops")
+            on_message(message)
+
+        # the error is reported, and the telemetry goes on
+        resourcer._on_message = faulty_on_message
+        await resourcer.wait_new("/sensors/encoder/angle", 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], RuntimeError)
+        self.assertEqual(resourcer.connections, 1)
+
+    async def test_binary_telemetry(self):
+        emulator = Emulator(telemetry_period_ms=5, binary=True)
+        emulator.start()
+        self.addCleanup(emulator.stop)
+        resourcer = _WSResourcer("127.0.0.1", emulator.port, 0.1, "all")
+        self.addAsyncCleanup(resourcer.close)
+        angle = await resourcer.wait_new("/sensors/encoder/angle", 1)
+        self.assertEqual(angle, 22)
+        self.assertEqual(
+            list(resourcer.get("/sensors/encoder/angle")["value"][:1]),
+            [22]
+        )
+
+    async def test_telemetry_bus(self):
+        with TelemetryPublisher(self.aero, history=8) as publisher:
+            reader = TelemetryReader(publisher.name)
+            self.addCleanup(reader.close)
+            self.assertEqual(reader.uris, ("/sensors/encoder/angle", ))
+            self.assertIsNone(reader.sensors.encoder.angle.get())
+
+            await self.aero.sensors.encoder.angle.wait_new(1)
+            await asyncio.sleep(0.1)
+            self.assertEqual(reader.sensors.encoder.angle.get(), 22)
+            # the oldest slot may be being written
+            samples = reader.sensors.encoder.angle.get_since()
+            self.assertEqual(len(samples), 7)
+            self.assertEqual(samples["seq"][-1], reader.seq - 1)
+            self.assertEqual(
+                reader.values("/sensors/encoder/angle")[0],
+                22
+            )
+
+            # from another process
+            with multiprocessing.Pool(1) as pool:
+                angle = pool.apply(_read_bus, (publisher.name, ))
+            self.assertEqual(angle, 22)
+
+        with self.assertRaises(ValueError):
+            reader.get("/fakeuri")
+
+    def test_telemetry_bus_wrap(self):
+        uri = "/sensors/encoder/angle"
+        publisher = TelemetryPublisher(self.aero, history=4)
+        self.addCleanup(publisher.close)
+        reader = TelemetryReader(publisher.name)
+        self.addCleanup(reader.close)
+
+        # a newer seq than published, e.g. from before a restart
+        publisher._publish(0, 0.0, [0.0])
+        self.assertEqual(len(reader.get_since(uri, 10)), 0)
+
+        # the publisher wraps the ring buffer while it's read, every
+        # returned sample must be the one of its seq
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, switch_interval)
+
+        def publish():
+            for seq in range(1, 200000):
+                publisher._publish(seq, float(seq), [float(seq)])
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        while thread.is_alive():
+            samples = reader.get_since(uri)
+            np.testing.assert_array_equal(samples["value"], samples["seq"])
+            np.testing.assert_array_equal(
+                samples["timestamp"],
+                samples["seq"]
+            )
+        thread.join()
+
+
+def _read_bus(name):
+    with TelemetryReader(name) as reader:
+        return reader.sensors.encoder.angle.get()
+
+
+class PendulumPlantTestCase(TestCase):
+    def test_steady_state(self):
+        plant = PendulumPlant()
+        plant.duty_percent = 4.57 + 41.68 * 0.5
+        plant.step(30)
+        self.assertAlmostEqual(plant.angle_deg, 30, 0)
+
+    def test_rests_on_the_stop(self):
+        plant = PendulumPlant()
+        plant.step(1)
+        self.assertEqual(plant.angle_deg, 22)
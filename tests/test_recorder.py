@@ -0,0 +1,125 @@
+import asyncio
+import math
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from nyquist.control import Experiment, LogReader, LogWriter, Recorder
+
+
+class MyControlExperiment(Experiment):
+    def before_the_loop(self):
+        pass
+
+    def in_the_loop(self):
+        pass
+
+    def after_the_loop(self):
+        pass
+
+
+class RecorderTestCase(TestCase):
+    def test_record(self):
+        recorder = Recorder(("time", "angle"), capacity=2, chunk=3)
+        for i in range(6):
+            recorder.record(time=i, angle=10 * i)
+
+        self.assertEqual(len(recorder), 6)
+        np.testing.assert_array_equal(recorder["time"], range(6))
+        np.testing.assert_array_equal(recorder["angle"], range(0, 60, 10))
+        self.assertEqual(recorder.to_numpy()[2]["angle"], 20)
+
+    def test_views(self):
+        recorder = Recorder(("time", "angle"))
+        recorder.record(time=1, angle=2)
+
+        recorder.to_numpy()["angle"][0] = 3
+        self.assertEqual(recorder["angle"][0], 3)
+
+    def test_missing_and_unknown_columns(self):
+        recorder = Recorder(("time", "angle"))
+        recorder.record(time=1)
+        self.assertTrue(math.isnan(recorder["angle"][0]))
+
+        with self.assertRaises(KeyError):
+            recorder.record(time=1, speed=3)
+
+        recorder.clear()
+        self.assertEqual(len(recorder), 0)
+
+    def test_for_experiment(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        exp = MyControlExperiment()
+        exp.set_loop_frequency(20)
+        exp.set_run_time(10)
+
+        recorder = Recorder.for_experiment(exp, ("time", ))
+
+        self.assertEqual(len(recorder._data), 201)
+
+    def test_to_csv(self):
+        recorder = Recorder(("time", "angle"))
+        recorder.record(time=0.5, angle=22)
+        recorder.record(time=1, angle=23)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.csv")
+            recorder.to_csv(path)
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(lines[0], "time,angle")
+        self.assertEqual(
+            [[float(v) for v in line.split(",")] for line in lines[1:]],
+            [[0.5, 22], [1, 23]],
+        )
+
+
+class LogTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.nyq")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_and_read(self):
+        with LogWriter(self.path, ("time", "angle"), chunk_rows=4) as log:
+            for i in range(10):
+                log.record(time=i, angle=10 * i)
+            self.assertEqual(len(log), 10)
+
+        reader = LogReader(self.path)
+        self.assertEqual(reader.columns, ("time", "angle"))
+        self.assertEqual(len(reader), 10)
+        np.testing.assert_array_equal(reader["time"], range(10))
+        np.testing.assert_array_equal(reader["angle"], range(0, 100, 10))
+        self.assertIsInstance(reader.to_numpy(), np.memmap)
+
+    def test_read_while_writing(self):
+        log = LogWriter(self.path, ("time", ), chunk_rows=2)
+        self.assertEqual(len(LogReader(self.path)), 0)
+
+        for i in range(5):
+            log.record(time=i)
+        log.close()
+        # drop half a row, as if the writer crashed
+        with open(self.path, "ab") as f:
+            f.write(b"\0" * 4)
+
+        np.testing.assert_array_equal(LogReader(self.path)["time"], range(5))
+
+    def test_closed_and_invalid(self):
+        log = LogWriter(self.path, ("time", ))
+        with self.assertRaises(KeyError):
+            log.record(angle=3)
+        log.close()
+        with self.assertRaises(ValueError):
+            log.record(time=1)
+
+        with open(self.path, "wb") as f:
+            f.write(b"definitely not a log")
+        with self.assertRaises(ValueError):
+            LogReader(self.path)